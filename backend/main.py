@@ -1,30 +1,37 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from typing import AsyncIterator, List, Optional, Dict, Any
+from datetime import datetime
 import os
+import asyncio
+import hashlib
 import logging
+import orjson
 from dotenv import load_dotenv
 
-from services.ai_service import AIService
+from services.ai_service import get_ai_service, close_http_client
 from services.transcription_service import TranscriptionService
-from services.expense_parser_service import ExpenseParserService
-from services.spending_analysis_service import SpendingAnalysisService
-from services.database_service import DatabaseService
+from services.expense_parser_service import ExpenseParserService, ExpenseParseResult
+from services.spending_analysis_service import SpendingAnalysisService, SpendingAnalysisResult
+from services.database_service import get_database_service
+from services.cache_service import TTLCache
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (per-request logs are DEBUG; set LOG_LEVEL=DEBUG to see them)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
 app = FastAPI(
     title="ExpenseAI Backend",
     description="Python backend for ExpenseAI application",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -34,68 +41,121 @@ app.add_middleware(
         "http://localhost:9002", 
         "http://localhost:3000",
         "https://expenseai-frontend.onrender.com",  # Deployed frontend
-        "https://*.onrender.com"  # Allow all Render subdomains
     ],
+    # CORSMiddleware compares allow_origins literally, so Render subdomains need a regex
+    allow_origin_regex=r"https://[a-z0-9-]+\.onrender\.com",
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization"],
+    # Let browsers cache preflight responses for a day
+    max_age=86400,
 )
 
-# Initialize services
-ai_service = AIService()
+# Compress large JSON payloads (exports, transaction lists, analysis answers)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# Initialize services (AI clients and the database pool are shared process-wide)
+ai_service = get_ai_service()
 transcription_service = TranscriptionService()
 expense_parser_service = ExpenseParserService()
 spending_analysis_service = SpendingAnalysisService()
-db_service = DatabaseService()
+db_service = get_database_service()
+
+# Monthly summaries keyed by year_month; invalidated whenever transactions change
+summary_cache = TTLCache(maxsize=64, ttl=300)
+
+# Voice results keyed by audio hash so idempotent client retries skip both AI calls
+voice_cache = TTLCache(maxsize=256, ttl=24 * 3600)
+
+@app.on_event("startup")
+async def open_database_pool():
+    await db_service.init_pool()
+
+# Seconds a warm-up request may take before it is abandoned
+WARMUP_TIMEOUT_SECONDS = 10
+
+@app.on_event("startup")
+async def warm_up_ai_clients():
+    """Opt-in: issue one tiny request per provider so the first user request is warm
+    
+    Each request is billed, so this is off unless WARMUP_AI_CLIENTS=true. It runs
+    in the background and never delays startup.
+    """
+    if os.getenv("WARMUP_AI_CLIENTS", "false").lower() != "true":
+        return
+    
+    warmups = []
+    if ai_service.gemini_model:
+        warmups.append(ai_service.generate_with_gemini("ping", system_prompt="reply ok", cache_key_prefix=None))
+    if ai_service.openai_client:
+        warmups.append(ai_service.generate_with_openai("ping", system_prompt="reply ok", cache_key_prefix=None))
+    app.state.warmup_tasks = [asyncio.create_task(_warm_up(call)) for call in warmups]
+
+async def _warm_up(call):
+    try:
+        await asyncio.wait_for(call, WARMUP_TIMEOUT_SECONDS)
+    except Exception as e:
+        # A failed warmup is harmless; the first real request simply connects itself
+        logger.warning("AI client warmup failed: %s", e)
+
+@app.on_event("startup")
+async def announce_ready():
+    # start-app.py watches stdout for this line; printed rather than logged so
+    # it appears at any LOG_LEVEL (uvicorn's own startup line is INFO)
+    print("ExpenseAI backend ready", flush=True)
+
+@app.on_event("shutdown")
+async def close_clients():
+    for task in getattr(app.state, "warmup_tasks", []):
+        task.cancel()
+    await close_http_client()
+    await ai_service.close()
+    await db_service.close()
 
 # Pydantic models for request/response
-class TranscriptionRequest(BaseModel):
+class APIModel(BaseModel):
+    # Defaults spelled out so no extra checks run on the hot path
+    model_config = ConfigDict(extra='ignore', frozen=False, validate_assignment=False)
+
+class TranscriptionRequest(APIModel):
     audio_data_uri: str
 
-class TranscriptionResponse(BaseModel):
+class TranscriptionResponse(APIModel):
     text: str
 
-class ExpenseParseRequest(BaseModel):
+class ExpenseParseRequest(APIModel):
     text: str
 
-class ExpenseParseResponse(BaseModel):
-    amount: float
-    category_name: str
-    date: Optional[str] = None
+class ExpenseBatchParseRequest(APIModel):
+    texts: List[str]
 
-class SpendingAnalysisRequest(BaseModel):
+class SpendingAnalysisRequest(APIModel):
     question: str
     year_month: Optional[str] = None
     transactions: List[Dict[str, Any]]
     categories: List[Dict[str, str]]
 
-class SpendingAnalysisResponse(BaseModel):
-    answer: str
-    explanation: str
-    sql: Optional[str] = None
-    preview: Optional[str] = None
-
-class VoiceExpenseRequest(BaseModel):
+class VoiceExpenseRequest(APIModel):
     audio_data_uri: str
 
-class VoiceExpenseResponse(BaseModel):
+class VoiceExpenseResponse(APIModel):
     transcription: Optional[str] = None
-    parsed_expense: Optional[ExpenseParseResponse] = None
+    parsed_expense: Optional[ExpenseParseResult] = None
     error: Optional[str] = None
 
 # Database models
-class CategoryCreateRequest(BaseModel):
+class CategoryCreateRequest(APIModel):
     id: str
     name: str
     color: Optional[str] = None
     icon: Optional[str] = None
 
-class CategoryUpdateRequest(BaseModel):
+class CategoryUpdateRequest(APIModel):
     name: Optional[str] = None
     color: Optional[str] = None
     icon: Optional[str] = None
 
-class TransactionCreateRequest(BaseModel):
+class TransactionCreateRequest(APIModel):
     id: str
     amount: float
     categoryId: str
@@ -103,17 +163,35 @@ class TransactionCreateRequest(BaseModel):
     notes: Optional[str] = None
     date: str
 
-class TransactionUpdateRequest(BaseModel):
+class TransactionUpdateRequest(APIModel):
     amount: Optional[float] = None
     categoryId: Optional[str] = None
     categoryName: Optional[str] = None
     notes: Optional[str] = None
     date: Optional[str] = None
 
-class SpendingAnalysisDBRequest(BaseModel):
+class SpendingAnalysisDBRequest(APIModel):
     question: str
     year_month: Optional[str] = None
 
+# Flush streamed JSON in chunks of roughly this many bytes
+STREAM_CHUNK_BYTES = 64 * 1024
+
+async def stream_json_array(rows: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """Serialize rows as a JSON array, yielding buffered chunks as they fill"""
+    buffer = bytearray(b"[")
+    first = True
+    async for row in rows:
+        if not first:
+            buffer += b","
+        buffer += orjson.dumps(row)
+        first = False
+        if len(buffer) >= STREAM_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b"]"
+    yield bytes(buffer)
+
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -126,76 +204,80 @@ async def health_check():
 # Transcription endpoint
 @app.post("/api/transcribe", response_model=TranscriptionResponse)
 async def transcribe_audio(request: TranscriptionRequest):
-    try:
-        logger.info("Starting audio transcription...")
-        result = await transcription_service.transcribe_audio(request.audio_data_uri)
-        logger.info(f"Transcription completed: {result.text[:50]}...")
-        return result
-    except Exception as e:
-        logger.error(f"Transcription error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
+    logger.debug("Starting audio transcription...")
+    result = await transcription_service.transcribe_audio(request.audio_data_uri)
+    logger.debug("Transcription completed: %s...", result.text[:50])
+    return result
 
 # Expense parsing endpoint
-@app.post("/api/parse-expense", response_model=ExpenseParseResponse)
+@app.post("/api/parse-expense", response_model=ExpenseParseResult)
 async def parse_expense_from_text(request: ExpenseParseRequest):
-    try:
-        logger.info(f"Parsing expense from text: {request.text}")
-        result = await expense_parser_service.parse_expense_from_text(request.text)
-        logger.info(f"Expense parsed: {result}")
-        # Convert internal model to response model
-        return ExpenseParseResponse(**result.model_dump())
-    except Exception as e:
-        logger.error(f"Expense parsing error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Expense parsing failed: {str(e)}")
+    logger.debug("Parsing expense from text: %s", request.text)
+    result = await expense_parser_service.parse_expense_from_text(request.text)
+    logger.debug("Expense parsed: %s", result)
+    return result
+
+@app.post("/api/parse-expenses", response_model=List[Optional[ExpenseParseResult]])
+async def parse_expenses_batch(request: ExpenseBatchParseRequest):
+    logger.debug("Parsing %d expenses in one batch", len(request.texts))
+    return await expense_parser_service.parse_expenses_batch(request.texts)
 
 # Spending analysis endpoint
-@app.post("/api/analyze-spending", response_model=SpendingAnalysisResponse)
+@app.post("/api/analyze-spending", response_model=SpendingAnalysisResult)
 async def analyze_spending(request: SpendingAnalysisRequest):
-    try:
-        logger.info(f"Analyzing spending for question: {request.question}")
-        result = await spending_analysis_service.answer_spending_question(
-            question=request.question,
-            year_month=request.year_month,
-            transactions=request.transactions,
-            categories=request.categories
-        )
-        logger.info(f"Spending analysis completed")
-        return result
-    except Exception as e:
-        logger.error(f"Spending analysis error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Spending analysis failed: {str(e)}")
+    logger.debug("Analyzing spending for question: %s", request.question)
+    result = await spending_analysis_service.answer_spending_question(
+        question=request.question,
+        year_month=request.year_month,
+        transactions=request.transactions,
+        categories=request.categories
+    )
+    logger.debug("Spending analysis completed")
+    return result
 
 # Voice expense processing endpoint (combines transcription + parsing)
 @app.post("/api/process-voice-expense", response_model=VoiceExpenseResponse)
 async def process_voice_expense(request: VoiceExpenseRequest):
     try:
-        logger.info("Starting voice expense processing...")
+        logger.debug("Starting voice expense processing...")
+        
+        # The base64 payload identifies the audio, so hash it without decoding
+        audio_hash = hashlib.sha256(request.audio_data_uri.encode()).hexdigest()
+        cached = voice_cache.get(audio_hash)
+        if cached is not None:
+            logger.debug("Voice expense cache hit: %s", audio_hash)
+            return cached
         
         # Step 1: Transcribe audio
         transcription_result = await transcription_service.transcribe_audio(request.audio_data_uri)
-        logger.info(f"Transcription result: {transcription_result.text}")
+        logger.debug("Transcription result: %s", transcription_result.text)
         
         if not transcription_result.text:
             raise Exception("Transcription failed - no text returned.")
         
         # Check if transcription is meaningful
         if len(transcription_result.text.strip().split()) < 3:
-            raise Exception("Transcription too short. Please speak clearly and include the amount, category, and optionally the date.")
+            raise HTTPException(
+                status_code=422,
+                detail="Transcription too short. Please speak clearly and include the amount, category, and optionally the date."
+            )
         
         # Step 2: Parse expense from transcribed text
-        logger.info(f"Parsing expense from text: {transcription_result.text}")
+        logger.debug("Parsing expense from text: %s", transcription_result.text)
         parsed_expense = await expense_parser_service.parse_expense_from_text(transcription_result.text)
-        logger.info(f"Parsed expense: {parsed_expense}")
-        # Convert internal model to response model
-        parsed_expense_response = ExpenseParseResponse(**parsed_expense.model_dump())
+        logger.debug("Parsed expense: %s", parsed_expense)
         
-        return VoiceExpenseResponse(
+        result = VoiceExpenseResponse(
             transcription=transcription_result.text,
-            parsed_expense=parsed_expense_response
+            parsed_expense=parsed_expense
         )
+        voice_cache.set(audio_hash, result)
+        return result
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error in process_voice_expense: {str(e)}")
+        logger.error("Error in process_voice_expense: %s", e)
         return VoiceExpenseResponse(
             error=f"Failed to process audio: {str(e)}"
         )
@@ -203,198 +285,160 @@ async def process_voice_expense(request: VoiceExpenseRequest):
 # Database endpoints
 @app.post("/api/categories")
 async def create_category(request: CategoryCreateRequest):
-    try:
-        logger.info(f"Creating category: {request.name}")
-        result = await db_service.create_category(request.model_dump())
-        logger.info(f"Category created successfully: {result}")
-        return result
-    except Exception as e:
-        logger.error(f"Category creation error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Category creation failed: {str(e)}")
+    logger.debug("Creating category: %s", request.name)
+    result = await db_service.create_category(request.model_dump())
+    logger.debug("Category created successfully: %s", result)
+    return result
 
 @app.get("/api/categories")
 async def get_categories():
-    try:
-        logger.info("Fetching all categories")
-        result = await db_service.get_all_categories()
-        logger.info(f"Retrieved {len(result)} categories")
-        return result
-    except Exception as e:
-        logger.error(f"Category fetch error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Category fetch failed: {str(e)}")
+    logger.debug("Fetching all categories")
+    result = await db_service.get_all_categories()
+    logger.debug("Retrieved %s categories", len(result))
+    return result
 
 @app.get("/api/categories/{category_id}")
 async def get_category(category_id: str):
-    try:
-        logger.info(f"Fetching category: {category_id}")
-        result = await db_service.get_category_by_id(category_id)
-        if not result:
-            raise HTTPException(status_code=404, detail="Category not found")
-        return result
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Category fetch error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Category fetch failed: {str(e)}")
+    logger.debug("Fetching category: %s", category_id)
+    result = await db_service.get_category_by_id(category_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return result
 
 @app.put("/api/categories/{category_id}")
 async def update_category(category_id: str, request: CategoryUpdateRequest):
-    try:
-        logger.info(f"Updating category: {category_id}")
-        # Filter out None values
-        updates = {k: v for k, v in request.model_dump().items() if v is not None}
-        if not updates:
-            raise HTTPException(status_code=400, detail="No valid fields to update")
-        
-        result = await db_service.update_category(category_id, updates)
-        logger.info(f"Category updated successfully: {result}")
-        return result
-    except Exception as e:
-        logger.error(f"Category update error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Category update failed: {str(e)}")
+    logger.debug("Updating category: %s", category_id)
+    # Filter out None values
+    updates = request.model_dump(exclude_none=True)
+    if not updates:
+        raise HTTPException(status_code=400, detail="No valid fields to update")
+    
+    result = await db_service.update_category(category_id, updates)
+    logger.debug("Category updated successfully: %s", result)
+    return result
 
 @app.delete("/api/categories/{category_id}")
 async def delete_category(category_id: str):
-    try:
-        logger.info(f"Deleting category: {category_id}")
-        result = await db_service.delete_category(category_id)
-        logger.info(f"Category deleted successfully")
-        return {"message": "Category deleted successfully"}
-    except Exception as e:
-        logger.error(f"Category deletion error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Category deletion failed: {str(e)}")
+    logger.debug("Deleting category: %s", category_id)
+    result = await db_service.delete_category(category_id)
+    logger.debug("Category deleted successfully")
+    return {"message": "Category deleted successfully"}
 
 @app.post("/api/transactions")
 async def create_transaction(request: TransactionCreateRequest):
-    try:
-        logger.info(f"Creating transaction: {request.amount} for {request.categoryName}")
-        result = await db_service.create_transaction(request.model_dump())
-        logger.info(f"Transaction created successfully: {result}")
-        return result
-    except Exception as e:
-        logger.error(f"Transaction creation error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Transaction creation failed: {str(e)}")
+    logger.debug("Creating transaction: %s for %s", request.amount, request.categoryName)
+    result = await db_service.create_transaction(request.model_dump())
+    summary_cache.pop(result['year_month'])
+    logger.debug("Transaction created successfully: %s", result)
+    return result
 
 @app.get("/api/transactions")
 async def get_transactions(year_month: Optional[str] = None, limit: Optional[int] = None):
-    try:
-        if year_month:
-            logger.info(f"Fetching transactions for month: {year_month}")
-            result = await db_service.get_transactions_by_month(year_month)
-        else:
-            logger.info(f"Fetching all transactions with limit: {limit}")
-            result = await db_service.get_all_transactions(limit)
-        
-        logger.info(f"Retrieved {len(result)} transactions")
-        return result
-    except Exception as e:
-        logger.error(f"Transaction fetch error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Transaction fetch failed: {str(e)}")
+    if year_month:
+        logger.debug("Fetching transactions for month: %s", year_month)
+        result = await db_service.get_transactions_by_month(year_month)
+    elif limit is None:
+        # Unbounded listing: stream rows instead of buffering the whole table
+        logger.debug("Streaming all transactions")
+        return StreamingResponse(
+            stream_json_array(db_service.iter_all_transactions()),
+            media_type="application/json"
+        )
+    else:
+        logger.debug("Fetching all transactions with limit: %s", limit)
+        result = await db_service.get_all_transactions(limit)
+    
+    logger.debug("Retrieved %s transactions", len(result))
+    return result
 
 @app.get("/api/transactions/{transaction_id}")
 async def get_transaction(transaction_id: str):
-    try:
-        logger.info(f"Fetching transaction: {transaction_id}")
-        result = await db_service.get_transaction_by_id(transaction_id)
-        if not result:
-            raise HTTPException(status_code=404, detail="Transaction not found")
-        return result
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Transaction fetch error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Transaction fetch failed: {str(e)}")
+    logger.debug("Fetching transaction: %s", transaction_id)
+    result = await db_service.get_transaction_by_id(transaction_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    return result
 
 @app.put("/api/transactions/{transaction_id}")
 async def update_transaction(transaction_id: str, request: TransactionUpdateRequest):
-    try:
-        logger.info(f"Updating transaction: {transaction_id}")
-        # Filter out None values
-        updates = {k: v for k, v in request.model_dump().items() if v is not None}
-        if not updates:
-            raise HTTPException(status_code=400, detail="No valid fields to update")
-        
-        result = await db_service.update_transaction(transaction_id, updates)
-        logger.info(f"Transaction updated successfully: {result}")
-        return result
-    except Exception as e:
-        logger.error(f"Transaction update error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Transaction update failed: {str(e)}")
+    logger.debug("Updating transaction: %s", transaction_id)
+    # Filter out None values
+    updates = request.model_dump(exclude_none=True)
+    if not updates:
+        raise HTTPException(status_code=400, detail="No valid fields to update")
+    
+    result = await db_service.update_transaction(transaction_id, updates)
+    # The date may have moved the transaction between months
+    summary_cache.clear()
+    logger.debug("Transaction updated successfully: %s", result)
+    return result
 
 @app.delete("/api/transactions/{transaction_id}")
 async def delete_transaction(transaction_id: str):
-    try:
-        logger.info(f"Deleting transaction: {transaction_id}")
-        result = await db_service.delete_transaction(transaction_id)
-        logger.info(f"Transaction deleted successfully")
-        return {"message": "Transaction deleted successfully"}
-    except Exception as e:
-        logger.error(f"Transaction deletion error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Transaction deletion failed: {str(e)}")
+    logger.debug("Deleting transaction: %s", transaction_id)
+    result = await db_service.delete_transaction(transaction_id)
+    summary_cache.clear()
+    logger.debug("Transaction deleted successfully")
+    return {"message": "Transaction deleted successfully"}
 
-@app.post("/api/analyze-spending-db", response_model=SpendingAnalysisResponse)
+@app.post("/api/analyze-spending-db", response_model=SpendingAnalysisResult)
 async def analyze_spending_from_db(request: SpendingAnalysisDBRequest):
-    try:
-        logger.info(f"Analyzing spending from database for question: {request.question}")
-        result = await spending_analysis_service.answer_spending_question_from_db(
-            question=request.question,
-            year_month=request.year_month
-        )
-        logger.info(f"Database spending analysis completed")
-        return result
-    except Exception as e:
-        logger.error(f"Database spending analysis error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Database spending analysis failed: {str(e)}")
+    logger.debug("Analyzing spending from database for question: %s", request.question)
+    result = await spending_analysis_service.answer_spending_question_from_db(
+        question=request.question,
+        year_month=request.year_month
+    )
+    logger.debug("Database spending analysis completed")
+    return result
 
 @app.get("/api/monthly-summary/{year_month}")
 async def get_monthly_summary(year_month: str):
-    try:
-        logger.info(f"Fetching monthly summary for: {year_month}")
+    logger.debug("Fetching monthly summary for: %s", year_month)
+    result = summary_cache.get(year_month)
+    if result is None:
         result = await db_service.get_monthly_summary(year_month)
-        logger.info(f"Monthly summary retrieved successfully")
-        return result
-    except Exception as e:
-        logger.error(f"Monthly summary error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Monthly summary failed: {str(e)}")
+        summary_cache.set(year_month, result)
+    logger.debug("Monthly summary retrieved successfully")
+    return result
 
 @app.get("/api/available-months")
 async def get_available_months():
-    try:
-        logger.info("Fetching available months")
-        result = await db_service.get_available_months()
-        logger.info(f"Retrieved {len(result)} available months")
-        return result
-    except Exception as e:
-        logger.error(f"Available months error: {str(e)}")
-        raise Exception(f"Available months failed: {str(e)}")
+    logger.debug("Fetching available months")
+    result = await db_service.get_available_months()
+    logger.debug("Retrieved %s available months", len(result))
+    return result
 
 @app.get("/api/export-data")
 async def export_data():
-    try:
-        logger.info("Exporting all data")
-        result = await db_service.export_data()
-        logger.info("Data export completed successfully")
-        return result
-    except Exception as e:
-        logger.error(f"Data export error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Data export failed: {str(e)}")
+    logger.debug("Exporting all data")
+    categories = await db_service.get_all_categories()
+    header = orjson.dumps({
+        'export_date': datetime.now().isoformat(),
+        'categories': categories
+    })
+    
+    async def generate():
+        # Reopen the header object and stream transactions into it
+        yield header[:-1] + b',"transactions":'
+        async for chunk in stream_json_array(db_service.iter_all_transactions()):
+            yield chunk
+        yield b"}"
+    
+    return StreamingResponse(generate(), media_type="application/json")
 
 @app.post("/api/import-data")
 async def import_data(data: Dict[str, Any]):
-    try:
-        logger.info("Importing data")
-        result = await db_service.import_data(data)
-        logger.info(f"Data import completed: {result}")
-        return result
-    except Exception as e:
-        logger.error(f"Data import error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Data import failed: {str(e)}")
+    logger.debug("Importing data")
+    result = await db_service.import_data(data)
+    summary_cache.clear()
+    logger.debug("Data import completed: %s", result)
+    return result
 
 # Error handlers
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
-    logger.error(f"Global exception handler: {str(exc)}")
-    return JSONResponse(
+    logger.error("Global exception handler: %s", exc)
+    return ORJSONResponse(
         status_code=500,
         content={"detail": f"Internal server error: {str(exc)}"}
     )
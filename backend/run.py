@@ -5,29 +5,58 @@ Startup script for ExpenseAI Python Backend
 
 import uvicorn
 import os
+import sys
+import asyncio
 from dotenv import load_dotenv
 
+from services.database_service import get_database_service
+
 # Load environment variables
 load_dotenv()
 
+
+async def archive_prior_years():
+    """Move finished years into yearly archive files, once, before the workers start"""
+    db_service = get_database_service()
+    try:
+        archived = await db_service.archive_prior_years()
+        print(f"Archived {archived} transactions from prior years")
+    finally:
+        await db_service.close()
+
+
 if __name__ == "__main__":
     # Get configuration from environment variables
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", "8000"))
     debug = os.getenv("DEBUG", "false").lower() == "true"
+    # Caches (LLM responses, monthly summaries) are per process, so scale out
+    # explicitly via WEB_CONCURRENCY rather than defaulting to one worker per core
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    log_level = os.getenv("LOG_LEVEL", "warning").lower()
     
     print(f"Starting ExpenseAI Backend...")
     print(f"Host: {host}")
     print(f"Port: {port}")
     print(f"Debug: {debug}")
+    print(f"Workers: {1 if debug else workers}")
     print(f"OpenAI API Key: {'Set' if os.getenv('OPENAI_API_KEY') else 'Not Set'}")
     print(f"Google API Key: {'Set' if os.getenv('GOOGLE_API_KEY') else 'Not Set'}")
     
-    # Start the server
+    # Opt-in; done here rather than in a startup hook so it runs once, not once per worker
+    if os.getenv("ARCHIVE_PRIOR_YEARS", "false").lower() == "true":
+        asyncio.run(archive_prior_years())
+    
+    # Start the server (reload and multiple workers are mutually exclusive)
     uvicorn.run(
         "main:app",
         host=host,
         port=port,
         reload=debug,
-        log_level="info"
+        workers=None if debug else workers,
+        # uvloop is not available on Windows
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        log_level=log_level,
+        access_log=debug
     )
@@ -1,18 +1,180 @@
 import os
+import re
+import json
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+import functools
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+import httpx
+import orjson
 import google.generativeai as genai
-from openai import OpenAI
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
+from .cache_service import TTLCache, create_shared_cache, make_cache_key
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+GEMINI_MODEL_NAME = 'gemini-2.0-flash-exp'
+
+# Query both providers at once and keep the first answer (costs a second call per request)
+RACE_PROVIDERS = os.getenv("RACE_PROVIDERS", "false").lower() == "true"
+
+# Default TTL for cached model responses (matches Gemini's default context cache TTL)
+DEFAULT_CACHE_TTL_SECONDS = 3600
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_JSON_DECODER = json.JSONDecoder()
+
+# Process-wide HTTP client so every OpenAI call reuses pooled HTTP/2 connections
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared httpx client, creating it on first use"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100)
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared httpx client (called on application shutdown)"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def _normalize_prompt(text: Optional[str]) -> str:
+    """Collapse whitespace so trivially different prompts share a cache entry"""
+    if not text:
+        return ""
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def cached_generation(provider: str, default_model: str):
+    """
+    Cache responses of an AIService generate_* coroutine.
+
+    The cache key is sha256(provider + model + system_prompt + prompt) over the
+    whitespace-normalized prompt text. Callers can pass cache_key_prefix
+    and ttl_seconds to tune entries per use case, or cache_key_prefix=None to
+    bypass the cache. A response is only stored if the optional validate
+    callable accepts it, so a malformed reply is never served again from the
+    cache. Lookups check the in-process cache first, then the shared Redis
+    cache when one is configured.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(
+            self,
+            prompt: str,
+            system_prompt: Optional[str] = None,
+            *args,
+            cache_key_prefix: Optional[str] = "llm",
+            ttl_seconds: Optional[int] = None,
+            validate: Optional[Callable[[str], bool]] = None,
+            **kwargs
+        ) -> str:
+            if cache_key_prefix is None:
+                return await func(self, prompt, system_prompt, *args, **kwargs)
+
+            model = kwargs.get("model") or (args[0] if args else default_model)
+            key = make_cache_key(
+                cache_key_prefix,
+                provider,
+                model,
+                _normalize_prompt(system_prompt),
+                _normalize_prompt(prompt)
+            )
+
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                logger.debug("AI response cache hit (%s, %s)", provider, cache_key_prefix)
+                return cached
+
+            shared_cache = self.shared_cache
+            if shared_cache is not None:
+                try:
+                    cached = await shared_cache.get(key)
+                except Exception as e:
+                    # The shared cache is an optimization; never fail a request over it
+                    logger.warning("Shared cache read failed: %s", e)
+                if cached is not None:
+                    logger.debug("AI response shared cache hit (%s, %s)", provider, cache_key_prefix)
+                    self.response_cache.set(key, cached, ttl=ttl_seconds)
+                    return cached
+
+            response = await func(self, prompt, system_prompt, *args, **kwargs)
+            if validate is not None and not validate(response):
+                logger.debug("AI response failed validation; not caching (%s, %s)", provider, cache_key_prefix)
+                return response
+            self.response_cache.set(key, response, ttl=ttl_seconds)
+            if shared_cache is not None and isinstance(response, str):
+                try:
+                    await shared_cache.set(key, response, ttl_seconds or DEFAULT_CACHE_TTL_SECONDS)
+                except Exception as e:
+                    logger.warning("Shared cache write failed: %s", e)
+            return response
+
+        return wrapper
+    return decorator
+
+
+class InflightDeduplicator:
+    """
+    Share one upstream model call between identical concurrent requests.
+
+    Calls go out immediately with no wait window or concurrency cap; a second
+    request with the same arguments while the first is still running awaits
+    the same call. Cancelling a request cancels the upstream call once no
+    other request is waiting on it.
+    """
+
+    def __init__(self, handler: Callable[..., Awaitable[str]]):
+        self._handler = handler
+        # args -> [upstream task, number of requests waiting on it]
+        self._inflight: Dict[tuple, List[Any]] = {}
+
+    async def submit(self, *args) -> str:
+        """Run the handler for args, or join an identical call already in flight"""
+        entry = self._inflight.get(args)
+        if entry is None:
+            entry = self._inflight[args] = [asyncio.ensure_future(self._handler(*args)), 0]
+            entry[0].add_done_callback(lambda _task: self._forget(args, entry))
+        entry[1] += 1
+        try:
+            # shield: one waiter being cancelled must not cancel the shared call
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                # Nobody is left waiting, so stop paying for the upstream call
+                self._forget(args, entry)
+                entry[0].cancel()
+
+    def _forget(self, args: tuple, entry: List[Any]) -> None:
+        if self._inflight.get(args) is entry:
+            del self._inflight[args]
+
+
 class AIService:
     def __init__(self):
         self.openai_client = None
         self.gemini_model = None
+        self.response_cache = TTLCache(maxsize=1024, ttl=DEFAULT_CACHE_TTL_SECONDS)
+        # Redis-backed second tier shared across workers (None unless REDIS_URL is set)
+        self.shared_cache = create_shared_cache()
+        self._gemini_inflight = InflightDeduplicator(self._gemini_request)
+        self._openai_inflight = InflightDeduplicator(self._openai_request)
         self._initialize_clients()
     
     def _initialize_clients(self):
@@ -21,7 +183,10 @@ class AIService:
             # Initialize OpenAI client
             openai_api_key = os.getenv("OPENAI_API_KEY")
             if openai_api_key:
-                self.openai_client = OpenAI(api_key=openai_api_key)
+                self.openai_client = AsyncOpenAI(
+                    api_key=openai_api_key,
+                    http_client=get_http_client()
+                )
                 logger.info("OpenAI client initialized successfully")
             else:
                 logger.warning("OPENAI_API_KEY not found in environment variables")
@@ -30,7 +195,7 @@ class AIService:
             google_api_key = os.getenv("GOOGLE_API_KEY")
             if google_api_key:
                 genai.configure(api_key=google_api_key)
-                self.gemini_model = genai.GenerativeModel('gemini-2.0-flash-exp')
+                self.gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
                 logger.info("Google AI client initialized successfully")
             else:
                 logger.warning("GOOGLE_API_KEY not found in environment variables")
@@ -38,55 +203,131 @@ class AIService:
         except Exception as e:
             logger.error(f"Error initializing AI clients: {str(e)}")
     
+    async def close(self):
+        """Release the shared cache connection"""
+        if self.shared_cache is not None:
+            await self.shared_cache.close()
+    
+    @cached_generation("gemini", GEMINI_MODEL_NAME)
     async def generate_with_gemini(self, prompt: str, system_prompt: Optional[str] = None) -> str:
         """Generate response using Google Gemini"""
         if not self.gemini_model:
             raise Exception("Google AI client not initialized")
         
         try:
-            full_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
-            response = self.gemini_model.generate_content(full_prompt)
-            return response.text
+            return await self._gemini_inflight.submit(prompt, system_prompt)
         except Exception as e:
             logger.error(f"Error generating with Gemini: {str(e)}")
             raise
     
+    async def _gemini_request(self, prompt: str, system_prompt: Optional[str]) -> str:
+        full_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+        response = await self.gemini_model.generate_content_async(full_prompt)
+        return response.text
+    
+    @cached_generation("openai", "gpt-4")
     async def generate_with_openai(self, prompt: str, system_prompt: Optional[str] = None, model: str = "gpt-4") -> str:
         """Generate response using OpenAI"""
         if not self.openai_client:
             raise Exception("OpenAI client not initialized")
         
         try:
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": prompt})
-            
-            response = self.openai_client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=0.1
-            )
-            return response.choices[0].message.content
+            return await self._openai_inflight.submit(prompt, system_prompt, model)
         except Exception as e:
             logger.error(f"Error generating with OpenAI: {str(e)}")
             raise
     
+    async def generate(self, prompt: str, system_prompt: Optional[str] = None, **cache_options) -> str:
+        """
+        Generate a response from whichever provider is available
+        
+        Gemini is preferred with OpenAI as the fallback; with RACE_PROVIDERS
+        enabled both are called concurrently and the first success wins.
+        cache_options (cache_key_prefix, ttl_seconds, validate) go to both providers.
+        """
+        if RACE_PROVIDERS and self.gemini_model and self.openai_client:
+            return await self._race_providers(prompt, system_prompt, **cache_options)
+        
+        try:
+            return await self.generate_with_gemini(prompt, system_prompt, **cache_options)
+        except Exception as e:
+            logger.warning(f"Gemini failed, trying OpenAI: {str(e)}")
+            return await self.generate_with_openai(prompt, system_prompt, **cache_options)
+    
+    async def _race_providers(self, prompt: str, system_prompt: Optional[str], **cache_options) -> str:
+        """Return the first successful provider response, cancelling the slower call"""
+        pending = {
+            asyncio.create_task(self.generate_with_gemini(prompt, system_prompt, **cache_options)),
+            asyncio.create_task(self.generate_with_openai(prompt, system_prompt, **cache_options))
+        }
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                    logger.warning(f"Provider failed while racing: {str(error)}")
+            raise error
+        finally:
+            # Cancelling reaches the upstream request (InflightDeduplicator cancels
+            # it once nobody else awaits it); wait so it is torn down before returning
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+    
+    async def _openai_request(self, prompt: str, system_prompt: Optional[str], model: str) -> str:
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        
+        response = await self.openai_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.1
+        )
+        return response.choices[0].message.content
+    
+    def is_json_response(self, response: str) -> bool:
+        """True if parse_json_response would succeed (used to decide what gets cached)"""
+        try:
+            _decode_json_response(response)
+            return True
+        except json.JSONDecodeError:
+            return False
+    
     def parse_json_response(self, response: str) -> Dict[str, Any]:
         """Parse JSON response from AI model"""
-        import json
-        import re
-        
         try:
-            # Try to extract JSON from the response
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                return json.loads(json_str)
-            else:
-                # If no JSON found, try to parse the entire response
-                return json.loads(response)
+            return _decode_json_response(response)
         except json.JSONDecodeError as e:
             logger.error(f"Error parsing JSON response: {str(e)}")
             logger.error(f"Response was: {response}")
             raise Exception(f"Failed to parse AI response as JSON: {str(e)}")
+
+
+def _decode_json_response(response: str) -> Any:
+    """Decode the JSON object in a model response, raising json.JSONDecodeError"""
+    start = response.find('{')
+    if start < 0:
+        # If no JSON found, try to parse the entire response
+        return orjson.loads(response)
+    # Fast path: the outermost braces hold the whole object
+    end = response.rfind('}')
+    try:
+        return orjson.loads(response[start:end + 1])
+    except orjson.JSONDecodeError:
+        pass
+    # Decode the first JSON object in the response; raw_decode finds its
+    # end in the same linear pass, so surrounding prose is ignored
+    parsed, _ = _JSON_DECODER.raw_decode(response, start)
+    return parsed
+
+
+@functools.lru_cache(maxsize=1)
+def get_ai_service() -> AIService:
+    """Return the process-wide AIService so every service shares clients, in-flight calls and cache"""
+    return AIService()
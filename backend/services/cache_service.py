@@ -0,0 +1,99 @@
+import os
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Small in-process LRU cache with per-entry expiry"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or default if missing or expired"""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove a key and return its value"""
+        entry = self._data.pop(key, None)
+        return entry[1] if entry else default
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_MISSING = object()
+
+
+class RedisCache:
+    """Async string cache on Redis, shared by every worker and kept across restarts"""
+
+    def __init__(self, url: str, namespace: str = "expenseai"):
+        # Optional dependency: only needed when REDIS_URL is configured
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(url)
+        self.namespace = namespace
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self._client.get(f"{self.namespace}:{key}")
+        return value.decode("utf-8") if value is not None else None
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self._client.set(f"{self.namespace}:{key}", value.encode("utf-8"), ex=max(1, int(ttl)))
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+def create_shared_cache() -> Optional[RedisCache]:
+    """Return a RedisCache when REDIS_URL is set, otherwise None"""
+    url = os.getenv("REDIS_URL")
+    if not url:
+        return None
+    try:
+        return RedisCache(url)
+    except ImportError:
+        logger.warning("REDIS_URL is set but the redis package is not installed; using the in-process cache only")
+        return None
+
+
+def make_cache_key(*parts: Optional[str]) -> str:
+    """Build a stable SHA256 cache key from string parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
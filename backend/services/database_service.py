@@ -1,24 +1,204 @@
+import re
 import sqlite3
 import logging
 import json
-from datetime import datetime, date
-from typing import List, Dict, Any, Optional
+import functools
+import queue
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import os
 
 logger = logging.getLogger(__name__)
 
+# Rows per executemany batch when importing backups
+IMPORT_CHUNK_SIZE = 10000
+
+
+def _chunked(rows: List[tuple], size: int):
+    """Yield successive slices of at most size rows"""
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+# Rows fetched per worker-thread hop when streaming transactions
+STREAM_FETCH_SIZE = 1000
+
+# Prepared statements are cached per connection keyed by SQL text, so fixed
+# queries live here as constants and are shared by every call
+STATEMENT_CACHE_SIZE = 256
+
+# year_month is derived by SQLite from the ISO date on every write
+_SQL_CREATE_TRANSACTIONS = """
+    CREATE TABLE {if_not_exists} {table} (
+        id TEXT PRIMARY KEY,
+        amount REAL NOT NULL,
+        category_id TEXT NOT NULL,
+        category_name TEXT NOT NULL,
+        notes TEXT,
+        date TEXT NOT NULL,
+        year_month TEXT GENERATED ALWAYS AS (substr(date, 1, 7)) STORED,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (category_id) REFERENCES categories (id)
+    )
+"""
+
+_CATEGORY_COLUMNS = "id, name, color, icon, created_at"
+# Aliased to the API field names so sqlite3.Row rows convert straight to dicts
+_TRANSACTION_COLUMNS = (
+    "id, amount, category_id AS categoryId, category_name AS categoryName, "
+    "notes, date, year_month, created_at"
+)
+
+# RETURNING (SQLite 3.35+) hands back the written row from the same statement
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+_SQL_INSERT_CATEGORY = "INSERT INTO categories (id, name, color, icon) VALUES (?, ?, ?, ?)"
+_SQL_INSERT_CATEGORY_RETURNING = f"{_SQL_INSERT_CATEGORY} RETURNING {_CATEGORY_COLUMNS}"
+_SQL_SELECT_CATEGORIES = f"SELECT {_CATEGORY_COLUMNS} FROM categories ORDER BY name"
+_SQL_SELECT_CATEGORY_BY_ID = f"SELECT {_CATEGORY_COLUMNS} FROM categories WHERE id = ?"
+_SQL_CATEGORY_HAS_TXNS = "SELECT 1 FROM transactions WHERE category_id = ? LIMIT 1"
+_SQL_CATEGORY_HAS_ARCHIVED_TXNS = "SELECT 1 FROM all_transactions WHERE category_id = ? LIMIT 1"
+_SQL_DELETE_CATEGORY = "DELETE FROM categories WHERE id = ?"
+
+_SQL_INSERT_TXN = (
+    "INSERT INTO transactions (id, amount, category_id, category_name, notes, date) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+_SQL_INSERT_TXN_RETURNING = f"{_SQL_INSERT_TXN} RETURNING {_TRANSACTION_COLUMNS}"
+# Month-scoped queries take the schema holding that year ("main" or an archive)
+_SQL_SELECT_TXNS_BY_MONTH = (
+    f"SELECT {_TRANSACTION_COLUMNS} FROM {{schema}}.transactions "
+    "WHERE year_month = ? ORDER BY date DESC, created_at DESC"
+)
+# all_transactions is a per-connection TEMP VIEW over the live table and every archive
+_SQL_SELECT_ALL_TXNS = f"SELECT {_TRANSACTION_COLUMNS} FROM all_transactions ORDER BY date DESC, created_at DESC"
+_SQL_SELECT_TXNS_LIMIT = f"{_SQL_SELECT_ALL_TXNS} LIMIT ?"
+_SQL_SELECT_TXN_BY_ID = f"SELECT {_TRANSACTION_COLUMNS} FROM all_transactions WHERE id = ?"
+_SQL_DELETE_TXN = "DELETE FROM transactions WHERE id = ?"
+# Stay well under SQLite's bound-parameter limit for IN (...) lists
+IDS_PER_QUERY = 500
+
+# Totals, per-category breakdown and the largest transaction in one round-trip
+_SQL_MONTH_SUMMARY = """
+    WITH m AS (
+        SELECT amount, category_name, notes, date
+        FROM {schema}.transactions
+        WHERE year_month = ?
+    )
+    SELECT
+        (SELECT SUM(amount) FROM m),
+        (SELECT COUNT(*) FROM m),
+        (SELECT json_group_array(json_object('category', category_name, 'amount', total, 'count', cnt))
+         FROM (
+             SELECT category_name, SUM(amount) AS total, COUNT(*) AS cnt
+             FROM m
+             GROUP BY category_name
+             ORDER BY total DESC
+         )),
+        (SELECT json_object('amount', amount, 'category', category_name, 'notes', notes, 'date', date)
+         FROM m
+         ORDER BY amount DESC
+         LIMIT 1)
+"""
+_SQL_AVAILABLE_MONTHS = "SELECT DISTINCT year_month FROM all_transactions ORDER BY year_month DESC"
+
+_ARCHIVE_COPY_COLUMNS = "id, amount, category_id, category_name, notes, date, created_at, updated_at"
+_SQL_ARCHIVE_COPY = (
+    f"INSERT OR REPLACE INTO {{schema}}.transactions ({_ARCHIVE_COPY_COLUMNS}) "
+    f"SELECT {_ARCHIVE_COPY_COLUMNS} FROM main.transactions WHERE year_month BETWEEN ? AND ?"
+)
+_SQL_ARCHIVE_DELETE = "DELETE FROM main.transactions WHERE year_month BETWEEN ? AND ?"
+
+_SQL_IMPORT_CATEGORY = (
+    "INSERT OR REPLACE INTO categories (id, name, color, icon, created_at) VALUES (?, ?, ?, ?, ?)"
+)
+_SQL_IMPORT_TXN = (
+    "INSERT OR REPLACE INTO transactions "
+    "(id, amount, category_id, category_name, notes, date, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+@functools.lru_cache(maxsize=64)
+def _for_schema(template: str, schema: str) -> str:
+    """Fill a month-scoped SQL template, reusing the same text per schema"""
+    return template.format(schema=schema)
+
+
+def _archive_schema(year: str) -> str:
+    return f"archive_{year}"
+
+
+class _Connection(sqlite3.Connection):
+    """sqlite3 connection that remembers which archive set it was opened with"""
+    archive_generation = 0
+
+
+@functools.lru_cache(maxsize=64)
+def _build_select_txns_by_ids_sql(count: int) -> str:
+    """SELECT transactions by an IN list of count placeholders"""
+    placeholders = ", ".join("?" * count)
+    return f"SELECT {_TRANSACTION_COLUMNS} FROM all_transactions WHERE id IN ({placeholders})"
+
+
+@functools.lru_cache(maxsize=128)
+def _build_update_sql(
+    table: str,
+    columns: Tuple[str, ...],
+    touch_updated_at: bool = False,
+    returning: Optional[str] = None
+) -> str:
+    """Compose an UPDATE for a given set of columns, reusing the same text per shape"""
+    set_clauses = [f"{column} = ?" for column in columns]
+    if touch_updated_at:
+        set_clauses.append("updated_at = CURRENT_TIMESTAMP")
+    sql = f"UPDATE {table} SET {', '.join(set_clauses)} WHERE id = ?"
+    if returning:
+        sql += f" RETURNING {returning}"
+    return sql
+
+
 class DatabaseService:
-    def __init__(self, db_path: str = "expenseai.db"):
+    # Columns that update_category / update_transaction may set
+    _CAT_UPDATABLE = frozenset({'name', 'color', 'icon'})
+    _TXN_UPDATABLE = frozenset({'amount', 'category_id', 'category_name', 'notes', 'date'})
+    # The API sends transaction fields in camelCase
+    _TXN_FIELD_COLUMNS = {'categoryId': 'category_id', 'categoryName': 'category_name'}
+    
+    def __init__(self, db_path: str = "expenseai.db", pool_size: int = 8):
         self.db_path = db_path
+        self.pool_size = pool_size
+        # One writer connection plus a pool of read-only connections (WAL lets them run concurrently)
+        self._write_conn: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.Lock()
+        self._read_pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=pool_size)
+        # sqlite3 calls block, so they run on worker threads instead of the event loop.
+        # One thread per pooled reader means a worker never has to open a spare connection.
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Prior years moved out by archive_year, keyed by "YYYY"; readers ATTACH them
+        self._archives: Dict[str, str] = self._discover_archives()
+        self._archive_generation = 0
         self.init_database()
+        if self._archives:
+            self._resume_archives()
     
     def init_database(self):
         """Initialize the database with required tables"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with closing(sqlite3.connect(self.db_path)) as conn:
                 cursor = conn.cursor()
                 
+                # WAL lets readers proceed while a write is in progress, and with
+                # synchronous=NORMAL commits no longer fsync twice. The journal
+                # mode is persistent, so it only needs setting once per file.
+                cursor.execute("PRAGMA journal_mode=WAL")
+                
                 # Create categories table
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS categories (
@@ -31,27 +211,25 @@ class DatabaseService:
                 """)
                 
                 # Create transactions table with monthly partitioning
+                cursor.execute(_SQL_CREATE_TRANSACTIONS.format(if_not_exists="IF NOT EXISTS", table="transactions"))
+                self._migrate_generated_year_month(cursor)
+                
+                # Create indexes for better performance. The monthly listing is
+                # served in index order, and the per-category summary reads
+                # only index columns, so neither touches the table rows
                 cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS transactions (
-                        id TEXT PRIMARY KEY,
-                        amount REAL NOT NULL,
-                        category_id TEXT NOT NULL,
-                        category_name TEXT NOT NULL,
-                        notes TEXT,
-                        date TEXT NOT NULL,
-                        year_month TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (category_id) REFERENCES categories (id)
-                    )
+                    CREATE INDEX IF NOT EXISTS idx_txn_ym_date_created
+                    ON transactions (year_month, date DESC, created_at DESC)
                 """)
                 
-                # Create indexes for better performance
                 cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_transactions_year_month 
-                    ON transactions (year_month)
+                    CREATE INDEX IF NOT EXISTS idx_txn_ym_cat_amount
+                    ON transactions (year_month, category_name, amount)
                 """)
                 
+                # Superseded by the composite indexes above
+                cursor.execute("DROP INDEX IF EXISTS idx_transactions_year_month")
+                
                 cursor.execute("""
                     CREATE INDEX IF NOT EXISTS idx_transactions_date 
                     ON transactions (date)
@@ -62,6 +240,10 @@ class DatabaseService:
                     ON transactions (category_id)
                 """)
                 
+                conn.commit()
+                
+                # Refresh planner statistics so the covering indexes get picked
+                cursor.execute("ANALYZE")
                 conn.commit()
                 logger.info("Database initialized successfully")
                 
@@ -69,47 +251,207 @@ class DatabaseService:
             logger.error(f"Failed to initialize database: {str(e)}")
             raise
     
-    def _get_connection(self):
-        """Get a database connection"""
-        return sqlite3.connect(self.db_path)
+    def _migrate_generated_year_month(self, cursor: sqlite3.Cursor):
+        """Rebuild a pre-existing transactions table so year_month becomes a generated column
+        
+        All steps run in one BEGIN IMMEDIATE transaction, so a crash midway rolls
+        back to the old table. A transactions_old left by an earlier,
+        non-transactional run is merged back in and dropped.
+        """
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            columns = cursor.execute("PRAGMA table_xinfo(transactions)").fetchall()
+            # table_xinfo reports hidden=3 for STORED generated columns
+            generated = any(column[1] == 'year_month' and column[6] == 3 for column in columns)
+            leftover = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions_old'"
+            ).fetchone() is not None
+            
+            if not generated:
+                if leftover:
+                    raise sqlite3.DatabaseError(
+                        "Both transactions and transactions_old use the old layout; resolve manually"
+                    )
+                # SQLite cannot add a STORED generated column in place, so copy the
+                # rows into a freshly created table (its old indexes go with it)
+                logger.info("Migrating transactions.year_month to a generated column")
+                cursor.execute("ALTER TABLE transactions RENAME TO transactions_old")
+                cursor.execute(_SQL_CREATE_TRANSACTIONS.format(if_not_exists="", table="transactions"))
+            elif leftover:
+                logger.warning("Recovering rows from an interrupted year_month migration")
+            
+            if not generated or leftover:
+                cursor.execute("""
+                    INSERT OR IGNORE INTO transactions (
+                        id, amount, category_id, category_name, notes, date, created_at, updated_at
+                    )
+                    SELECT id, amount, category_id, category_name, notes, date, created_at, updated_at
+                    FROM transactions_old
+                """)
+                cursor.execute("DROP TABLE transactions_old")
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+    
+    def _get_connection(self, read_only: bool = False):
+        """Open a new database connection with per-connection tuning applied
+        
+        Dates and timestamps are stored and returned as ISO strings, so type
+        detection stays off and no converters run per row.
+        """
+        if read_only:
+            conn = sqlite3.connect(
+                f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE, detect_types=0, factory=_Connection
+            )
+        else:
+            conn = sqlite3.connect(
+                self.db_path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE,
+                detect_types=0, factory=_Connection
+            )
+        conn.row_factory = sqlite3.Row
+        # These PRAGMAs are per-connection, so every new handle needs them
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA cache_size=-64000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            self._attach_archives(conn)
+        return conn
+    
+    def _discover_archives(self) -> Dict[str, str]:
+        """Find yearly archive files (expenseai_YYYY.db) next to the main database"""
+        path = Path(self.db_path)
+        pattern = re.compile(rf"{re.escape(path.stem)}_(\d{{4}}){re.escape(path.suffix)}")
+        archives = {}
+        for candidate in path.parent.glob(f"{path.stem}_*{path.suffix}"):
+            match = pattern.fullmatch(candidate.name)
+            if match:
+                archives[match.group(1)] = str(candidate)
+        return archives
+    
+    def _archive_path(self, year: str) -> str:
+        path = Path(self.db_path)
+        return str(path.with_name(f"{path.stem}_{year}{path.suffix}"))
     
-    def _extract_year_month(self, date_str: str) -> str:
-        """Extract year-month from date string (YYYY-MM format)"""
+    def _attach_archives(self, conn: _Connection):
+        """ATTACH every archive read-only and expose them all through a TEMP VIEW"""
+        sources = ["SELECT * FROM main.transactions"]
+        for year, archive_path in sorted(self._archives.items()):
+            schema = _archive_schema(year)
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (f"file:{archive_path}?mode=ro",))
+            sources.append(f"SELECT * FROM {schema}.transactions")
+        conn.execute(f"CREATE TEMP VIEW all_transactions AS {' UNION ALL '.join(sources)}")
+        conn.archive_generation = self._archive_generation
+    
+    def _schema_for_month(self, year_month: str) -> str:
+        """Route a month to the archive holding its year, or the live table"""
+        year = year_month[:4]
+        return _archive_schema(year) if year in self._archives else "main"
+    
+    def _check_writable_date(self, date_value: Any):
+        """Refuse writes dated in an archived year (archives are read-only)"""
+        if isinstance(date_value, str) and date_value[:4] in self._archives:
+            raise Exception(f"Transactions dated {date_value[:4]} are archived and read-only")
+    
+    def _missing_transaction_error(self, transaction_id: str) -> Exception:
+        """Explain a write that matched no live row: archived, or not found at all"""
+        if self._archives and self._get_transaction_by_id(transaction_id) is not None:
+            return Exception(f"Transaction with ID {transaction_id} is archived and read-only")
+        return Exception(f"Transaction with ID {transaction_id} not found")
+    
+    @contextmanager
+    def _reader(self):
+        """Borrow a pooled read-only connection"""
         try:
-            if isinstance(date_str, str):
-                # Parse the date and extract year-month
-                parsed_date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                return parsed_date.strftime("%Y-%m")
-            elif isinstance(date_str, date):
-                return date_str.strftime("%Y-%m")
+            conn = self._read_pool.get_nowait()
+        except queue.Empty:
+            # Never block: open an extra connection when the pool is drained
+            conn = self._get_connection(read_only=True)
+        
+        try:
+            yield conn
+        finally:
+            # Connections opened before the latest archive_year lack its ATTACH
+            if conn.archive_generation != self._archive_generation:
+                conn.close()
             else:
-                # Default to current month
-                return datetime.now().strftime("%Y-%m")
-        except Exception as e:
-            logger.warning(f"Could not parse date {date_str}, using current month: {str(e)}")
-            return datetime.now().strftime("%Y-%m")
+                try:
+                    self._read_pool.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+    
+    @contextmanager
+    def _writer(self):
+        """Hold the single writer connection, committing or rolling back on exit"""
+        with self._write_lock:
+            if self._write_conn is None:
+                self._write_conn = self._get_connection()
+            with self._write_conn:
+                yield self._write_conn
+    
+    async def _run(self, func, *args):
+        """Run a blocking database call on the worker pool"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="sqlite")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+    
+    async def init_pool(self):
+        """Pre-open the writer and reader connections so the first requests skip connect"""
+        with self._write_lock:
+            if self._write_conn is None:
+                self._write_conn = self._get_connection()
+        while not self._read_pool.full():
+            self._read_pool.put_nowait(self._get_connection(read_only=True))
+        logger.info(f"Database pool ready with 1 writer and {self.pool_size} reader connections")
+    
+    async def close(self):
+        """Close all pooled reader connections and the writer"""
+        # Let in-flight queries finish before their connections go away
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        while True:
+            try:
+                self._read_pool.get_nowait().close()
+            except queue.Empty:
+                break
+        # Close the writer last: only a read-write handle can checkpoint the WAL on close
+        with self._write_lock:
+            if self._write_conn is not None:
+                self._write_conn.close()
+                self._write_conn = None
     
     # Category operations
     async def create_category(self, category_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new category"""
+        return await self._run(self._create_category, category_data)
+    
+    def _create_category(self, category_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            with self._get_connection() as conn:
+            with self._writer() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("""
-                    INSERT INTO categories (id, name, color, icon)
-                    VALUES (?, ?, ?, ?)
-                """, (
+                params = (
                     category_data['id'],
                     category_data['name'],
                     category_data.get('color'),
                     category_data.get('icon')
-                ))
+                )
+                
+                if SUPPORTS_RETURNING:
+                    cursor.execute(_SQL_INSERT_CATEGORY_RETURNING, params)
+                    row = cursor.fetchone()
+                    conn.commit()
+                    return dict(row)
                 
+                cursor.execute(_SQL_INSERT_CATEGORY, params)
                 conn.commit()
                 
                 # Return the created category
-                return await self.get_category_by_id(category_data['id'])
+                return self._get_category_by_id(category_data['id'])
                 
         except sqlite3.IntegrityError as e:
             if "UNIQUE constraint failed" in str(e):
@@ -121,27 +463,16 @@ class DatabaseService:
     
     async def get_all_categories(self) -> List[Dict[str, Any]]:
         """Get all categories"""
+        return await self._run(self._get_all_categories)
+    
+    def _get_all_categories(self) -> List[Dict[str, Any]]:
         try:
-            with self._get_connection() as conn:
+            with self._reader() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("""
-                    SELECT id, name, color, icon, created_at
-                    FROM categories
-                    ORDER BY name
-                """)
+                cursor.execute(_SQL_SELECT_CATEGORIES)
                 
-                rows = cursor.fetchall()
-                return [
-                    {
-                        'id': row[0],
-                        'name': row[1],
-                        'color': row[2],
-                        'icon': row[3],
-                        'created_at': row[4]
-                    }
-                    for row in rows
-                ]
+                return list(map(dict, cursor.fetchall()))
                 
         except Exception as e:
             logger.error(f"Failed to get categories: {str(e)}")
@@ -149,25 +480,18 @@ class DatabaseService:
     
     async def get_category_by_id(self, category_id: str) -> Optional[Dict[str, Any]]:
         """Get category by ID"""
+        return await self._run(self._get_category_by_id, category_id)
+    
+    def _get_category_by_id(self, category_id: str) -> Optional[Dict[str, Any]]:
         try:
-            with self._get_connection() as conn:
+            with self._reader() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("""
-                    SELECT id, name, color, icon, created_at
-                    FROM categories
-                    WHERE id = ?
-                """, (category_id,))
+                cursor.execute(_SQL_SELECT_CATEGORY_BY_ID, (category_id,))
                 
                 row = cursor.fetchone()
                 if row:
-                    return {
-                        'id': row[0],
-                        'name': row[1],
-                        'color': row[2],
-                        'icon': row[3],
-                        'created_at': row[4]
-                    }
+                    return dict(row)
                 return None
                 
         except Exception as e:
@@ -176,29 +500,33 @@ class DatabaseService:
     
     async def update_category(self, category_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
         """Update a category"""
+        return await self._run(self._update_category, category_id, updates)
+    
+    def _update_category(self, category_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            with self._get_connection() as conn:
+            with self._writer() as conn:
                 cursor = conn.cursor()
                 
-                # Build dynamic update query
-                set_clauses = []
-                values = []
+                # Sort the columns so each update shape maps to one statement
+                columns = tuple(sorted(updates.keys() & self._CAT_UPDATABLE))
                 
-                for key, value in updates.items():
-                    if key in ['name', 'color', 'icon']:
-                        set_clauses.append(f"{key} = ?")
-                        values.append(value)
-                
-                if not set_clauses:
+                if not columns:
                     raise Exception("No valid fields to update")
                 
+                values = [updates[column] for column in columns]
                 values.append(category_id)
                 
-                cursor.execute(f"""
-                    UPDATE categories 
-                    SET {', '.join(set_clauses)}
-                    WHERE id = ?
-                """, values)
+                if SUPPORTS_RETURNING:
+                    cursor.execute(
+                        _build_update_sql('categories', columns, returning=_CATEGORY_COLUMNS), values
+                    )
+                    row = cursor.fetchone()
+                    if row is None:
+                        raise Exception(f"Category with ID {category_id} not found")
+                    conn.commit()
+                    return dict(row)
+                
+                cursor.execute(_build_update_sql('categories', columns), values)
                 
                 if cursor.rowcount == 0:
                     raise Exception(f"Category with ID {category_id} not found")
@@ -206,7 +534,7 @@ class DatabaseService:
                 conn.commit()
                 
                 # Return the updated category
-                return await self.get_category_by_id(category_id)
+                return self._get_category_by_id(category_id)
                 
         except Exception as e:
             logger.error(f"Failed to update category: {str(e)}")
@@ -214,20 +542,22 @@ class DatabaseService:
     
     async def delete_category(self, category_id: str) -> bool:
         """Delete a category (only if no transactions reference it)"""
+        return await self._run(self._delete_category, category_id)
+    
+    def _delete_category(self, category_id: str) -> bool:
         try:
-            with self._get_connection() as conn:
+            with self._writer() as conn:
                 cursor = conn.cursor()
                 
                 # Check if category is used in transactions
-                cursor.execute("""
-                    SELECT COUNT(*) FROM transactions WHERE category_id = ?
-                """, (category_id,))
+                # Stop at the first matching index entry instead of counting them all
+                cursor.execute(_SQL_CATEGORY_HAS_TXNS, (category_id,))
                 
-                if cursor.fetchone()[0] > 0:
+                if cursor.fetchone() is not None or self._category_has_archived_transactions(category_id):
                     raise Exception("Cannot delete category that has associated transactions")
                 
                 # Delete the category
-                cursor.execute("DELETE FROM categories WHERE id = ?", (category_id,))
+                cursor.execute(_SQL_DELETE_CATEGORY, (category_id,))
                 
                 if cursor.rowcount == 0:
                     raise Exception(f"Category with ID {category_id} not found")
@@ -239,35 +569,45 @@ class DatabaseService:
             logger.error(f"Failed to delete category: {str(e)}")
             raise Exception(f"Failed to delete category: {str(e)}")
     
+    def _category_has_archived_transactions(self, category_id: str) -> bool:
+        # Archives only change under the writer lock, which the caller holds
+        if not self._archives:
+            return False
+        with self._reader() as conn:
+            return conn.execute(_SQL_CATEGORY_HAS_ARCHIVED_TXNS, (category_id,)).fetchone() is not None
+    
     # Transaction operations
     async def create_transaction(self, transaction_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new transaction"""
+        return await self._run(self._create_transaction, transaction_data)
+    
+    def _create_transaction(self, transaction_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            with self._get_connection() as conn:
+            self._check_writable_date(transaction_data['date'])
+            
+            with self._writer() as conn:
                 cursor = conn.cursor()
                 
-                # Extract year-month from date
-                year_month = self._extract_year_month(transaction_data['date'])
-                
-                cursor.execute("""
-                    INSERT INTO transactions (
-                        id, amount, category_id, category_name, notes, date, year_month
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
+                params = (
                     transaction_data['id'],
                     transaction_data['amount'],
                     transaction_data['categoryId'],
                     transaction_data['categoryName'],
                     transaction_data.get('notes'),
-                    transaction_data['date'],
-                    year_month
-                ))
+                    transaction_data['date']
+                )
                 
+                if SUPPORTS_RETURNING:
+                    cursor.execute(_SQL_INSERT_TXN_RETURNING, params)
+                    row = cursor.fetchone()
+                    conn.commit()
+                    return dict(row)
+                
+                cursor.execute(_SQL_INSERT_TXN, params)
                 conn.commit()
                 
                 # Return the created transaction
-                return await self.get_transaction_by_id(transaction_data['id'])
+                return self._get_transaction_by_id(transaction_data['id'])
                 
         except Exception as e:
             logger.error(f"Failed to create transaction: {str(e)}")
@@ -275,31 +615,19 @@ class DatabaseService:
     
     async def get_transactions_by_month(self, year_month: str) -> List[Dict[str, Any]]:
         """Get all transactions for a specific month (YYYY-MM format)"""
+        return await self._run(self._get_transactions_by_month, year_month)
+    
+    def _get_transactions_by_month(self, year_month: str) -> List[Dict[str, Any]]:
         try:
-            with self._get_connection() as conn:
+            with self._reader() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("""
-                    SELECT id, amount, category_id, category_name, notes, date, year_month, created_at
-                    FROM transactions
-                    WHERE year_month = ?
-                    ORDER BY date DESC, created_at DESC
-                """, (year_month,))
-                
-                rows = cursor.fetchall()
-                return [
-                    {
-                        'id': row[0],
-                        'amount': row[1],
-                        'categoryId': row[2],
-                        'categoryName': row[3],
-                        'notes': row[4],
-                        'date': row[5],
-                        'year_month': row[6],
-                        'created_at': row[7]
-                    }
-                    for row in rows
-                ]
+                cursor.execute(
+                    _for_schema(_SQL_SELECT_TXNS_BY_MONTH, self._schema_for_month(year_month)),
+                    (year_month,)
+                )
+                
+                return list(map(dict, cursor.fetchall()))
                 
         except Exception as e:
             logger.error(f"Failed to get transactions for month {year_month}: {str(e)}")
@@ -307,112 +635,127 @@ class DatabaseService:
     
     async def get_all_transactions(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get all transactions with optional limit"""
+        return await self._run(self._get_all_transactions, limit)
+    
+    def _get_all_transactions(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         try:
-            with self._get_connection() as conn:
+            with self._reader() as conn:
                 cursor = conn.cursor()
                 
-                query = """
-                    SELECT id, amount, category_id, category_name, notes, date, year_month, created_at
-                    FROM transactions
-                    ORDER BY date DESC, created_at DESC
-                """
-                
-                if limit:
-                    query += f" LIMIT {limit}"
-                
-                cursor.execute(query)
-                
-                rows = cursor.fetchall()
-                return [
-                    {
-                        'id': row[0],
-                        'amount': row[1],
-                        'categoryId': row[2],
-                        'categoryName': row[3],
-                        'notes': row[4],
-                        'date': row[5],
-                        'year_month': row[6],
-                        'created_at': row[7]
-                    }
-                    for row in rows
-                ]
+                # A negative LIMIT means no limit, so one statement serves every call
+                cursor.execute(_SQL_SELECT_TXNS_LIMIT, (limit or -1,))
+                
+                return list(map(dict, cursor.fetchall()))
                 
         except Exception as e:
             logger.error(f"Failed to get all transactions: {str(e)}")
             raise Exception(f"Failed to get transactions: {str(e)}")
     
+    async def iter_all_transactions(self, chunk_size: int = STREAM_FETCH_SIZE):
+        """Yield all transactions without building the full list, fetching in chunks"""
+        with self._reader() as conn:
+            cursor = conn.cursor()
+            
+            await self._run(cursor.execute, _SQL_SELECT_ALL_TXNS)
+            
+            while True:
+                rows = await self._run(cursor.fetchmany, chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+    
     async def get_transaction_by_id(self, transaction_id: str) -> Optional[Dict[str, Any]]:
         """Get transaction by ID"""
+        return await self._run(self._get_transaction_by_id, transaction_id)
+    
+    def _get_transaction_by_id(self, transaction_id: str) -> Optional[Dict[str, Any]]:
         try:
-            with self._get_connection() as conn:
+            with self._reader() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("""
-                    SELECT id, amount, category_id, category_name, notes, date, year_month, created_at
-                    FROM transactions
-                    WHERE id = ?
-                """, (transaction_id,))
+                cursor.execute(_SQL_SELECT_TXN_BY_ID, (transaction_id,))
                 
                 row = cursor.fetchone()
                 if row:
-                    return {
-                        'id': row[0],
-                        'amount': row[1],
-                        'categoryId': row[2],
-                        'categoryName': row[3],
-                        'notes': row[4],
-                        'date': row[5],
-                        'year_month': row[6],
-                        'created_at': row[7]
-                    }
+                    return dict(row)
                 return None
                 
         except Exception as e:
             logger.error(f"Failed to get transaction: {str(e)}")
             raise Exception(f"Failed to get transaction: {str(e)}")
     
+    async def get_transactions_by_ids(self, transaction_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get several transactions in one round-trip, in the order requested (missing IDs are skipped)"""
+        return await self._run(self._get_transactions_by_ids, transaction_ids)
+    
+    def _get_transactions_by_ids(self, transaction_ids: List[str]) -> List[Dict[str, Any]]:
+        try:
+            found = {}
+            with self._reader() as conn:
+                cursor = conn.cursor()
+                
+                for chunk in _chunked(list(dict.fromkeys(transaction_ids)), IDS_PER_QUERY):
+                    cursor.execute(_build_select_txns_by_ids_sql(len(chunk)), chunk)
+                    for row in cursor.fetchall():
+                        found[row['id']] = dict(row)
+            
+            return [found[txn_id] for txn_id in transaction_ids if txn_id in found]
+                
+        except Exception as e:
+            logger.error(f"Failed to get transactions by ids: {str(e)}")
+            raise Exception(f"Failed to get transactions: {str(e)}")
+    
     async def update_transaction(self, transaction_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
         """Update a transaction"""
+        return await self._run(self._update_transaction, transaction_id, updates)
+    
+    def _update_transaction(self, transaction_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            with self._get_connection() as conn:
+            with self._writer() as conn:
                 cursor = conn.cursor()
                 
-                # Build dynamic update query
-                set_clauses = []
-                values = []
+                updates = {
+                    self._TXN_FIELD_COLUMNS.get(key, key): value
+                    for key, value in updates.items()
+                }
                 
-                for key, value in updates.items():
-                    if key in ['amount', 'category_id', 'category_name', 'notes', 'date']:
-                        set_clauses.append(f"{key} = ?")
-                        values.append(value)
+                # Sort the columns so each update shape maps to one statement
+                columns = tuple(sorted(updates.keys() & self._TXN_UPDATABLE))
                 
-                if not set_clauses:
+                if not columns:
                     raise Exception("No valid fields to update")
                 
-                # Add updated_at timestamp
-                set_clauses.append("updated_at = CURRENT_TIMESTAMP")
-                
-                # If date is being updated, recalculate year_month
-                if 'date' in updates:
-                    year_month = self._extract_year_month(updates['date'])
-                    set_clauses.append("year_month = ?")
-                    values.append(year_month)
+                self._check_writable_date(updates.get('date'))
                 
+                values = [updates[column] for column in columns]
                 values.append(transaction_id)
                 
-                cursor.execute(f"""
-                    UPDATE transactions 
-                    SET {', '.join(set_clauses)}
-                    WHERE id = ?
-                """, values)
+                if SUPPORTS_RETURNING:
+                    cursor.execute(
+                        _build_update_sql(
+                            'transactions', columns,
+                            touch_updated_at=True, returning=_TRANSACTION_COLUMNS
+                        ),
+                        values
+                    )
+                    row = cursor.fetchone()
+                    if row is None:
+                        raise self._missing_transaction_error(transaction_id)
+                    conn.commit()
+                    return dict(row)
+                
+                cursor.execute(
+                    _build_update_sql('transactions', columns, touch_updated_at=True), values
+                )
                 
                 if cursor.rowcount == 0:
-                    raise Exception(f"Transaction with ID {transaction_id} not found")
+                    raise self._missing_transaction_error(transaction_id)
                 
                 conn.commit()
                 
                 # Return the updated transaction
-                return await self.get_transaction_by_id(transaction_id)
+                return self._get_transaction_by_id(transaction_id)
                 
         except Exception as e:
             logger.error(f"Failed to update transaction: {str(e)}")
@@ -420,14 +763,17 @@ class DatabaseService:
     
     async def delete_transaction(self, transaction_id: str) -> bool:
         """Delete a transaction"""
+        return await self._run(self._delete_transaction, transaction_id)
+    
+    def _delete_transaction(self, transaction_id: str) -> bool:
         try:
-            with self._get_connection() as conn:
+            with self._writer() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
+                cursor.execute(_SQL_DELETE_TXN, (transaction_id,))
                 
                 if cursor.rowcount == 0:
-                    raise Exception(f"Transaction with ID {transaction_id} not found")
+                    raise self._missing_transaction_error(transaction_id)
                 
                 conn.commit()
                 return True
@@ -439,59 +785,28 @@ class DatabaseService:
     # Analytics and reporting
     async def get_monthly_summary(self, year_month: str) -> Dict[str, Any]:
         """Get spending summary for a specific month"""
+        return await self._run(self._get_monthly_summary, year_month)
+    
+    def _get_monthly_summary(self, year_month: str) -> Dict[str, Any]:
         try:
-            with self._get_connection() as conn:
+            with self._reader() as conn:
                 cursor = conn.cursor()
                 
-                # Get total spending
-                cursor.execute("""
-                    SELECT SUM(amount), COUNT(*) FROM transactions WHERE year_month = ?
-                """, (year_month,))
-                
-                total_row = cursor.fetchone()
-                total_amount = total_row[0] or 0
-                transaction_count = total_row[1] or 0
+                cursor.execute(
+                    _for_schema(_SQL_MONTH_SUMMARY, self._schema_for_month(year_month)),
+                    (year_month,)
+                )
+                total_amount, transaction_count, breakdown_json, largest_json = cursor.fetchone()
                 
-                # Get spending by category
-                cursor.execute("""
-                    SELECT category_name, SUM(amount), COUNT(*)
-                    FROM transactions 
-                    WHERE year_month = ?
-                    GROUP BY category_name
-                    ORDER BY SUM(amount) DESC
-                """, (year_month,))
-                
-                category_breakdown = [
-                    {
-                        'category': row[0],
-                        'amount': row[1],
-                        'count': row[2]
-                    }
-                    for row in cursor.fetchall()
-                ]
-                
-                # Get largest transaction
-                cursor.execute("""
-                    SELECT amount, category_name, notes, date
-                    FROM transactions 
-                    WHERE year_month = ?
-                    ORDER BY amount DESC
-                    LIMIT 1
-                """, (year_month,))
-                
-                largest_transaction = cursor.fetchone()
+                category_breakdown = json.loads(breakdown_json)
+                largest_transaction = json.loads(largest_json) if largest_json else None
                 
                 return {
                     'year_month': year_month,
-                    'total_amount': total_amount,
-                    'transaction_count': transaction_count,
+                    'total_amount': total_amount or 0,
+                    'transaction_count': transaction_count or 0,
                     'category_breakdown': category_breakdown,
-                    'largest_transaction': {
-                        'amount': largest_transaction[0] if largest_transaction else 0,
-                        'category': largest_transaction[1] if largest_transaction else None,
-                        'notes': largest_transaction[2] if largest_transaction else None,
-                        'date': largest_transaction[3] if largest_transaction else None
-                    } if largest_transaction else None
+                    'largest_transaction': largest_transaction
                 }
                 
         except Exception as e:
@@ -500,15 +815,14 @@ class DatabaseService:
     
     async def get_available_months(self) -> List[str]:
         """Get list of all months that have transaction data"""
+        return await self._run(self._get_available_months)
+    
+    def _get_available_months(self) -> List[str]:
         try:
-            with self._get_connection() as conn:
+            with self._reader() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("""
-                    SELECT DISTINCT year_month 
-                    FROM transactions 
-                    ORDER BY year_month DESC
-                """)
+                cursor.execute(_SQL_AVAILABLE_MONTHS)
                 
                 return [row[0] for row in cursor.fetchall()]
                 
@@ -516,6 +830,100 @@ class DatabaseService:
             logger.error(f"Failed to get available months: {str(e)}")
             raise Exception(f"Failed to get available months: {str(e)}")
     
+    # Yearly archives
+    async def archive_year(self, year: int) -> int:
+        """Move a finished year's transactions into expenseai_YYYY.db
+        
+        Archived years stay visible to every read path but are read-only:
+        creating, updating or deleting a transaction dated in one is refused.
+        """
+        return await self._run(self._archive_year, year)
+    
+    def _archive_year(self, year: int) -> int:
+        try:
+            if year >= datetime.now().year:
+                raise Exception("Only past years can be archived")
+            
+            year_key = f"{year:04d}"
+            schema = _archive_schema(year_key)
+            archive_path = self._archive_path(year_key)
+            month_range = (f"{year_key}-01", f"{year_key}-12")
+            
+            with self._writer() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"ATTACH DATABASE ? AS {schema}", (archive_path,))
+                try:
+                    cursor.execute(_SQL_CREATE_TRANSACTIONS.format(
+                        if_not_exists="IF NOT EXISTS", table=f"{schema}.transactions"
+                    ))
+                    cursor.execute(f"""
+                        CREATE INDEX IF NOT EXISTS {schema}.idx_txn_ym_date_created
+                        ON transactions (year_month, date DESC, created_at DESC)
+                    """)
+                    
+                    # Under WAL a commit is only atomic within each file, so commit the
+                    # copy before the delete: a crash in between leaves rows in both
+                    # (never in neither) and _resume_archives finishes the move
+                    cursor.execute("BEGIN IMMEDIATE")
+                    try:
+                        cursor.execute(_for_schema(_SQL_ARCHIVE_COPY, schema), month_range)
+                        conn.commit()
+                        cursor.execute("BEGIN IMMEDIATE")
+                        cursor.execute(_SQL_ARCHIVE_DELETE, month_range)
+                        archived = cursor.rowcount
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                finally:
+                    cursor.execute(f"DETACH DATABASE {schema}")
+                
+                if year_key not in self._archives:
+                    self._archives[year_key] = archive_path
+                    self._retire_readers()
+            
+            logger.info(f"Archived {archived} transactions from {year_key} to {archive_path}")
+            return archived
+            
+        except Exception as e:
+            logger.error(f"Failed to archive {year}: {str(e)}")
+            raise Exception(f"Failed to archive {year}: {str(e)}")
+    
+    def _retire_readers(self):
+        """Drop pooled readers so new ones ATTACH the current archive set"""
+        self._archive_generation += 1
+        while True:
+            try:
+                self._read_pool.get_nowait().close()
+            except queue.Empty:
+                break
+    
+    def _resume_archives(self):
+        """Finish archive moves interrupted between the copy and delete commits"""
+        leftover = set(self._live_years_before(datetime.now().year)) & self._archives.keys()
+        for year in sorted(leftover):
+            logger.warning(f"Resuming interrupted archive of {year}")
+            self._archive_year(int(year))
+    
+    async def archive_prior_years(self) -> int:
+        """Archive every year before the current one still held in the live table"""
+        years = await self._run(self._live_years_before, datetime.now().year)
+        archived = 0
+        for year in years:
+            if year.isdigit():
+                archived += await self.archive_year(int(year))
+        return archived
+    
+    def _live_years_before(self, year: int) -> List[str]:
+        # The writer sees only the live table; readers also ATTACH the archives
+        with self._writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT DISTINCT substr(year_month, 1, 4) FROM main.transactions WHERE year_month < ?",
+                (f"{year:04d}",)
+            )
+            return [row[0] for row in cursor.fetchall()]
+    
     # Data export/import for backup
     async def export_data(self) -> Dict[str, Any]:
         """Export all data for backup purposes"""
@@ -535,62 +943,123 @@ class DatabaseService:
     
     async def import_data(self, data: Dict[str, Any]) -> Dict[str, int]:
         """Import data from backup"""
+        return await self._run(self._import_data, data)
+    
+    def _import_data(self, data: Dict[str, Any]) -> Dict[str, int]:
         try:
-            imported_categories = 0
-            imported_transactions = 0
+            # One timestamp for every row missing created_at
+            now_iso = datetime.now().isoformat()
             
-            with self._get_connection() as conn:
+            # Validate rows up front (types and NOT NULL columns) so the inserts can
+            # run as bulk statements; malformed rows are logged and skipped
+            category_rows = []
+            for category in data.get('categories', []):
+                try:
+                    category_rows.append((
+                        _required_text(category, 'id'),
+                        _required_text(category, 'name'),
+                        _optional_text(category, 'color'),
+                        _optional_text(category, 'icon'),
+                        category.get('created_at') or now_iso
+                    ))
+                except Exception as e:
+                    logger.warning(f"Failed to import category {category.get('name', 'Unknown')}: {str(e)}")
+            
+            transaction_rows = []
+            for transaction in data.get('transactions', []):
+                try:
+                    row = (
+                        _required_text(transaction, 'id'),
+                        _required_amount(transaction),
+                        _required_text(transaction, 'categoryId'),
+                        _required_text(transaction, 'categoryName'),
+                        _optional_text(transaction, 'notes'),
+                        _required_text(transaction, 'date'),
+                        transaction.get('created_at') or now_iso
+                    )
+                    # Rows of archived years already live in their yearly file
+                    self._check_writable_date(row[5])
+                    transaction_rows.append(row)
+                except Exception as e:
+                    logger.warning(f"Failed to import transaction {transaction.get('id', 'Unknown')}: {str(e)}")
+            
+            with self._writer() as conn:
                 cursor = conn.cursor()
                 
-                # Import categories
-                if 'categories' in data:
-                    for category in data['categories']:
-                        try:
-                            cursor.execute("""
-                                INSERT OR REPLACE INTO categories (id, name, color, icon, created_at)
-                                VALUES (?, ?, ?, ?, ?)
-                            """, (
-                                category['id'],
-                                category['name'],
-                                category.get('color'),
-                                category.get('icon'),
-                                category.get('created_at', datetime.now().isoformat())
-                            ))
-                            imported_categories += 1
-                        except Exception as e:
-                            logger.warning(f"Failed to import category {category.get('name', 'Unknown')}: {str(e)}")
-                
-                # Import transactions
-                if 'transactions' in data:
-                    for transaction in data['transactions']:
-                        try:
-                            year_month = self._extract_year_month(transaction['date'])
-                            cursor.execute("""
-                                INSERT OR REPLACE INTO transactions (
-                                    id, amount, category_id, category_name, notes, date, year_month, created_at
-                                )
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                            """, (
-                                transaction['id'],
-                                transaction['amount'],
-                                transaction['categoryId'],
-                                transaction['categoryName'],
-                                transaction.get('notes'),
-                                transaction['date'],
-                                year_month,
-                                transaction.get('created_at', datetime.now().isoformat())
-                            ))
-                            imported_transactions += 1
-                        except Exception as e:
-                            logger.warning(f"Failed to import transaction {transaction.get('id', 'Unknown')}: {str(e)}")
-                
-                conn.commit()
+                # Run the whole restore as one explicit transaction, taking the
+                # write lock up front instead of upgrading mid-import
+                cursor.execute("BEGIN IMMEDIATE")
+                try:
+                    # Import categories
+                    categories_imported = self._import_rows(cursor, _SQL_IMPORT_CATEGORY, category_rows, "category")
+                    
+                    # Import transactions
+                    transactions_imported = self._import_rows(cursor, _SQL_IMPORT_TXN, transaction_rows, "transaction")
+                    
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
                 
             return {
-                'categories_imported': imported_categories,
-                'transactions_imported': imported_transactions
+                'categories_imported': categories_imported,
+                'transactions_imported': transactions_imported
             }
             
         except Exception as e:
             logger.error(f"Failed to import data: {str(e)}")
             raise Exception(f"Failed to import data: {str(e)}")
+    
+    def _import_rows(self, cursor: sqlite3.Cursor, sql: str, rows: List[tuple], kind: str) -> int:
+        """Insert rows in bulk chunks, returning how many were stored
+        
+        A chunk that hits a constraint is rolled back to its savepoint and retried
+        row by row, so one bad row is skipped instead of failing the restore.
+        """
+        imported = 0
+        for chunk in _chunked(rows, IMPORT_CHUNK_SIZE):
+            cursor.execute("SAVEPOINT import_chunk")
+            try:
+                cursor.executemany(sql, chunk)
+                imported += len(chunk)
+            except sqlite3.Error:
+                cursor.execute("ROLLBACK TO import_chunk")
+                for row in chunk:
+                    try:
+                        cursor.execute(sql, row)
+                        imported += 1
+                    except sqlite3.Error as e:
+                        logger.warning(f"Failed to import {kind} {row[0]}: {str(e)}")
+            finally:
+                cursor.execute("RELEASE import_chunk")
+        return imported
+
+
+def _required_text(row: Dict[str, Any], field: str) -> str:
+    """Return a non-empty string field, raising ValueError otherwise"""
+    value = row[field]
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"{field} must be a non-empty string")
+    return value
+
+
+def _optional_text(row: Dict[str, Any], field: str) -> Optional[str]:
+    """Return a string field or None, raising ValueError for other types"""
+    value = row.get(field)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{field} must be a string")
+    return value
+
+
+def _required_amount(row: Dict[str, Any]) -> float:
+    """Return amount as a float, raising ValueError for null or non-numeric values"""
+    value = row['amount']
+    if value is None or isinstance(value, bool):
+        raise ValueError("amount must be a number")
+    return float(value)
+
+
+@functools.lru_cache(maxsize=None)
+def get_database_service(db_path: str = "expenseai.db") -> DatabaseService:
+    """Return the shared DatabaseService for a database file (one connection pool per file)"""
+    return DatabaseService(db_path)
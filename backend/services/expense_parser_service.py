@@ -1,11 +1,95 @@
+import re
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
 from pydantic import BaseModel
 
-from .ai_service import AIService
+from .ai_service import get_ai_service
+from .cache_service import TTLCache
+from .database_service import get_database_service
 
 logger = logging.getLogger(__name__)
 
+# Parsing is deterministic for a given text, so model responses can live long
+PARSE_CACHE_PREFIX = "parse-expense"
+PARSE_CACHE_TTL_SECONDS = 24 * 3600
+PARSE_RESULT_CACHE_SIZE = 4096
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_ISO_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def _is_calendar_date(value: str) -> bool:
+    """Reject well-formed but impossible dates such as 2024-02-30"""
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+        return True
+    except ValueError:
+        return False
+
+
+# Fallback amount patterns, most specific first
+_AMOUNT_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'₹\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',  # ₹1,234.56
+    r'(\d+(?:,\d{3})*(?:\.\d{2})?)\s*rupees?',  # 1234.56 rupees
+    r'(\d+(?:,\d{3})*(?:\.\d{2})?)\s*rs',  # 1234.56 rs
+    r'(\d+(?:,\d{3})*(?:\.\d{2})?)',  # Just numbers
+))
+
+# Any number in the text; more than one makes the amount ambiguous
+_NUMBER_RE = re.compile(r'\d+(?:,\d{3})*(?:\.\d+)?')
+
+# An amount the fast path may take as-is: at most two decimal places
+_FAST_PATH_AMOUNT_RE = re.compile(r'\d+(?:,\d{3})*(?:\.\d{1,2})?')
+
+# Words that imply a date the model should resolve, so such texts skip the fast path
+_DATE_HINT_RE = re.compile(
+    r'\b(today|yesterday|tomorrow|last|ago|'
+    r'mon|tue|wed|thu|fri|sat|sun|monday|tuesday|wednesday|thursday|friday|saturday|sunday|'
+    r'jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec|january|february|march|april|'
+    r'june|july|august|september|october|november|december)\b',
+    re.IGNORECASE
+)
+
+# Fallback category keywords; a keyword listed under two categories maps to the first
+CATEGORY_KEYWORDS = {
+    'groceries': ['grocery', 'food', 'vegetables', 'fruits', 'milk', 'bread'],
+    'transportation': ['transport', 'bus', 'train', 'metro', 'taxi', 'uber'],
+    'fuel': ['petrol', 'diesel', 'gas', 'fuel'],
+    'entertainment': ['movie', 'cinema', 'restaurant', 'dining', 'coffee'],
+    'shopping': ['clothes', 'shoes', 'electronics', 'gadget'],
+    'utilities': ['electricity', 'water', 'gas', 'internet', 'wifi'],
+    'healthcare': ['medicine', 'doctor', 'hospital', 'pharmacy'],
+    'education': ['books', 'course', 'tuition', 'college'],
+}
+
+# Built in reverse so earlier categories overwrite later ones on shared keywords
+_KEYWORD_TO_CATEGORY = {
+    keyword: category
+    for category, keywords in reversed(CATEGORY_KEYWORDS.items())
+    for keyword in keywords
+}
+
+# One scan over the text; word boundaries stop "gas" matching inside "grass"
+_CATEGORY_KEYWORD_RE = re.compile(
+    r'\b(' + '|'.join(map(re.escape, _KEYWORD_TO_CATEGORY)) + r')\b',
+    re.IGNORECASE
+)
+
+# Upper bounds for one batched model call
+MAX_BATCH_TEXTS = 50
+MAX_BATCH_PROMPT_CHARS = 6000
+
+# Kept byte-identical across calls so provider-side prefix caching can reuse it
+EXPENSE_PARSING_SYSTEM_PROMPT = """You are an AI assistant designed to extract expense information from text.
+
+You are given one or more numbered lines of text, each describing a single expense.
+For every line, extract the expense amount, category name, and date (if available).
+Respond in JSON format only, with exactly one entry per line, using the line number as "id".
+
+Output format: { "expenses": [ { "id": number, "amount": number, "categoryName": string, "date": string (ISO format YYYY-MM-DD, optional) } ] }"""
+
 class ExpenseParseResult(BaseModel):
     amount: float
     category_name: str
@@ -13,7 +97,13 @@ class ExpenseParseResult(BaseModel):
 
 class ExpenseParserService:
     def __init__(self):
-        self.ai_service = AIService()
+        self.ai_service = get_ai_service()
+        self.db_service = get_database_service()
+        # Parsed results keyed by normalized input text, so repeated phrasings skip the LLM
+        self.result_cache = TTLCache(maxsize=PARSE_RESULT_CACHE_SIZE, ttl=PARSE_CACHE_TTL_SECONDS)
+        # Texts resolved by the regex fast path vs. sent to the model, for tuning the heuristic
+        self.fast_path_hits = 0
+        self.fast_path_misses = 0
     
     async def parse_expense_from_text(self, text: str) -> ExpenseParseResult:
         """
@@ -28,42 +118,175 @@ class ExpenseParserService:
         try:
             logger.info(f"Parsing expense from text: {text}")
             
-            # Create the prompt for expense parsing
-            prompt = self._create_expense_parsing_prompt(text)
-            
-            # Generate response using Gemini (preferred) or OpenAI
-            try:
-                response = await self.ai_service.generate_with_gemini(prompt)
-            except Exception as e:
-                logger.warning(f"Gemini failed, trying OpenAI: {str(e)}")
-                response = await self.ai_service.generate_with_openai(prompt)
+            results, errors = await self._parse_batch([text])
+            if results[0] is None:
+                raise Exception(errors.get(0, "No result returned"))
             
-            # Parse the JSON response
-            parsed_data = self.ai_service.parse_json_response(response)
-            
-            # Validate and create result
-            result = self._validate_and_create_result(parsed_data)
-            logger.info(f"Expense parsed successfully: {result}")
-            return result
+            logger.info(f"Expense parsed successfully: {results[0]}")
+            return results[0]
             
         except Exception as e:
             logger.error(f"Error parsing expense from text: {str(e)}")
             raise Exception(f"Failed to parse expense: {str(e)}")
     
-    def _create_expense_parsing_prompt(self, text: str) -> str:
+    async def parse_expenses_batch(self, texts: List[str]) -> List[Optional[ExpenseParseResult]]:
         """
-        Create the prompt for expense parsing
+        Parse several expense texts with as few model calls as possible
+        
+        Args:
+            texts: Transcribed texts, one expense each
+            
+        Returns:
+            One ExpenseParseResult per text, or None where parsing failed
         """
-        system_prompt = """You are an AI assistant designed to extract expense information from text.
-
-Given the following text, extract the expense amount, category name, and date (if available).
-Respond in JSON format only.
-
-Output format: { "amount": number, "categoryName": string, "date": string (ISO format YYYY-MM-DD, optional) }"""
-
-        user_prompt = f"Text: {text}"
+        results, errors = await self._parse_batch(texts)
+        for index, error in errors.items():
+            logger.warning(f"Failed to parse expense {index + 1} of batch: {error}")
+        return results
+    
+    async def _parse_batch(
+        self, texts: List[str]
+    ) -> Tuple[List[Optional[ExpenseParseResult]], Dict[int, str]]:
+        """Resolve cache hits, send the misses in batched calls and retry failed lines once"""
+        keys = [_WHITESPACE_RE.sub(' ', text.strip().lower()) for text in texts]
+        results: List[Optional[ExpenseParseResult]] = [self.result_cache.get(key) for key in keys]
+        
+        # Unambiguous texts are answered locally; identical texts share one line in the prompt
+        known_categories = await self._known_categories() if None in results else {}
+        pending: Dict[str, str] = {}
+        for index, (key, text, result) in enumerate(zip(keys, texts, results)):
+            if result is not None or key in pending:
+                continue
+            result = self._parse_fast_path(text, known_categories)
+            if result is not None:
+                self.fast_path_hits += 1
+                self.result_cache.set(key, result)
+                results[index] = result
+                continue
+            self.fast_path_misses += 1
+            pending[key] = _WHITESPACE_RE.sub(' ', text.strip())
+        logger.debug("Expense fast path: %d hits, %d misses", self.fast_path_hits, self.fast_path_misses)
         
-        return f"{system_prompt}\n\n{user_prompt}"
+        parsed: Dict[str, ExpenseParseResult] = {}
+        failures: Dict[str, str] = {}
+        for attempt in range(2):
+            if not pending:
+                break
+            # The retry must reach the model again rather than the cached reply
+            parsed_now, failures = await self._parse_uncached(pending, use_cache=attempt == 0)
+            parsed.update(parsed_now)
+            # Only the lines that failed go into the retry
+            pending = {key: pending[key] for key in failures}
+        
+        for key, result in parsed.items():
+            self.result_cache.set(key, result)
+        
+        errors: Dict[int, str] = {}
+        for index, key in enumerate(keys):
+            if results[index] is None:
+                results[index] = parsed.get(key)
+                if results[index] is None:
+                    errors[index] = failures.get(key, "No result returned")
+        return results, errors
+    
+    async def _parse_uncached(
+        self, pending: Dict[str, str], use_cache: bool = True
+    ) -> Tuple[Dict[str, ExpenseParseResult], Dict[str, str]]:
+        """Parse texts keyed by cache key, one model call per chunk, chunks in parallel"""
+        chunks = self._chunk_for_prompt(list(pending.items()))
+        outcomes = await asyncio.gather(
+            *(self._parse_chunk(chunk, use_cache) for chunk in chunks), return_exceptions=True
+        )
+        
+        parsed: Dict[str, ExpenseParseResult] = {}
+        failures: Dict[str, str] = {}
+        for chunk, outcome in zip(chunks, outcomes):
+            if isinstance(outcome, Exception):
+                failures.update((key, str(outcome)) for key, _ in chunk)
+                continue
+            chunk_parsed, chunk_failures = outcome
+            parsed.update(chunk_parsed)
+            failures.update(chunk_failures)
+        return parsed, failures
+    
+    def _chunk_for_prompt(self, items: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+        """Split (key, text) pairs so each chunk fits the per-call text and size caps"""
+        chunks: List[List[Tuple[str, str]]] = []
+        current: List[Tuple[str, str]] = []
+        size = 0
+        for item in items:
+            if current and (len(current) >= MAX_BATCH_TEXTS or size + len(item[1]) > MAX_BATCH_PROMPT_CHARS):
+                chunks.append(current)
+                current, size = [], 0
+            current.append(item)
+            size += len(item[1])
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    async def _parse_chunk(
+        self, chunk: List[Tuple[str, str]], use_cache: bool = True
+    ) -> Tuple[Dict[str, ExpenseParseResult], Dict[str, str]]:
+        """Run one model call for a chunk and validate each returned entry"""
+        prompt = self._create_expense_parsing_prompt([text for _, text in chunk])
+        
+        # Generate response using Gemini (preferred) or OpenAI; only a reply that
+        # yields a valid result for every line is cached
+        response = await self.ai_service.generate(
+            prompt,
+            system_prompt=EXPENSE_PARSING_SYSTEM_PROMPT,
+            cache_key_prefix=PARSE_CACHE_PREFIX if use_cache else None,
+            ttl_seconds=PARSE_CACHE_TTL_SECONDS,
+            validate=lambda reply: self._is_complete_response(reply, chunk)
+        )
+        return self._results_from_response(response, chunk)
+    
+    def _is_complete_response(self, response: str, chunk: List[Tuple[str, str]]) -> bool:
+        """True if the reply parses and every line of the chunk got a valid result"""
+        if not self.ai_service.is_json_response(response):
+            return False
+        try:
+            _, failures = self._results_from_response(response, chunk)
+        except Exception:
+            return False
+        return not failures
+    
+    def _results_from_response(
+        self, response: str, chunk: List[Tuple[str, str]]
+    ) -> Tuple[Dict[str, ExpenseParseResult], Dict[str, str]]:
+        """Match a model reply's entries to the chunk's lines and validate each one"""
+        # Parse the JSON response
+        parsed_data = self.ai_service.parse_json_response(response)
+        entries = parsed_data.get('expenses')
+        if not isinstance(entries, list):
+            # A lone object is a valid answer for a single line
+            entries = [dict(parsed_data, id=1)] if len(chunk) == 1 else []
+        
+        by_id: Dict[int, Dict[str, Any]] = {}
+        for entry in entries:
+            try:
+                by_id[int(entry['id'])] = entry
+            except (KeyError, TypeError, ValueError):
+                continue
+        
+        parsed: Dict[str, ExpenseParseResult] = {}
+        failures: Dict[str, str] = {}
+        for line_id, (key, _) in enumerate(chunk, start=1):
+            entry = by_id.get(line_id)
+            if entry is None:
+                failures[key] = "No result returned for this text"
+                continue
+            try:
+                parsed[key] = self._validate_and_create_result(entry)
+            except Exception as e:
+                failures[key] = str(e)
+        return parsed, failures
+    
+    def _create_expense_parsing_prompt(self, texts: List[str]) -> str:
+        """
+        Create the user prompt for expense parsing (the system prompt is constant)
+        """
+        return "\n".join(f"{line_id}. {text}" for line_id, text in enumerate(texts, start=1))
     
     def _validate_and_create_result(self, parsed_data: Dict[str, Any]) -> ExpenseParseResult:
         """
@@ -99,8 +322,8 @@ Output format: { "amount": number, "categoryName": string, "date": string (ISO f
         date = None
         if 'date' in parsed_data and parsed_data['date']:
             date = str(parsed_data['date']).strip()
-            # Basic date format validation (YYYY-MM-DD)
-            if len(date) != 10 or date[4] != '-' or date[7] != '-':
+            # Date format validation (YYYY-MM-DD), then calendar validity
+            if not _ISO_DATE_RE.fullmatch(date) or not _is_calendar_date(date):
                 logger.warning(f"Invalid date format: {date}, ignoring date")
                 date = None
         
@@ -110,22 +333,47 @@ Output format: { "amount": number, "categoryName": string, "date": string (ISO f
             date=date
         )
     
+    async def _known_categories(self) -> Dict[str, str]:
+        """The user's category names keyed by lowercase name (empty if they can't be read)"""
+        try:
+            categories = await self.db_service.get_all_categories()
+        except Exception as e:
+            logger.warning(f"Could not load categories for the fast path: {str(e)}")
+            return {}
+        return {category['name'].lower(): category['name'] for category in categories}
+    
+    def _parse_fast_path(self, text: str, known_categories: Dict[str, str]) -> Optional[ExpenseParseResult]:
+        """
+        Parse texts like "spent 45 on coffee" without the model: exactly one number
+        with at most two decimals, a single keyword category that the user already
+        has, and no date words. Returns None otherwise.
+        """
+        numbers = _NUMBER_RE.findall(text)
+        if len(numbers) != 1 or not _FAST_PATH_AMOUNT_RE.fullmatch(numbers[0]):
+            return None
+        if _DATE_HINT_RE.search(text):
+            return None
+        
+        categories = {_KEYWORD_TO_CATEGORY[match.lower()] for match in _CATEGORY_KEYWORD_RE.findall(text)}
+        if len(categories) != 1:
+            return None
+        # A keyword bucket the user has no category for is left to the model
+        category_name = known_categories.get(categories.pop())
+        if category_name is None:
+            return None
+        
+        amount = float(numbers[0].replace(',', ''))
+        if amount <= 0:
+            return None
+        
+        return ExpenseParseResult(amount=amount, category_name=category_name)
+    
     def _extract_amount_from_text(self, text: str) -> float:
         """
         Fallback method to extract amount using regex patterns
         """
-        import re
-        
-        # Common currency patterns
-        patterns = [
-            r'₹\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',  # ₹1,234.56
-            r'(\d+(?:,\d{3})*(?:\.\d{2})?)\s*rupees?',  # 1234.56 rupees
-            r'(\d+(?:,\d{3})*(?:\.\d{2})?)\s*rs',  # 1234.56 rs
-            r'(\d+(?:,\d{3})*(?:\.\d{2})?)',  # Just numbers
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in _AMOUNT_PATTERNS:
+            match = pattern.search(text)
             if match:
                 amount_str = match.group(1).replace(',', '')
                 try:
@@ -139,23 +387,9 @@ Output format: { "amount": number, "categoryName": string, "date": string (ISO f
         """
         Fallback method to extract category using keyword matching
         """
-        text_lower = text.lower()
-        
-        # Common expense categories and their keywords
-        category_keywords = {
-            'groceries': ['grocery', 'food', 'vegetables', 'fruits', 'milk', 'bread'],
-            'transportation': ['transport', 'bus', 'train', 'metro', 'taxi', 'uber'],
-            'fuel': ['petrol', 'diesel', 'gas', 'fuel'],
-            'entertainment': ['movie', 'cinema', 'restaurant', 'dining', 'coffee'],
-            'shopping': ['clothes', 'shoes', 'electronics', 'gadget'],
-            'utilities': ['electricity', 'water', 'gas', 'internet', 'wifi'],
-            'healthcare': ['medicine', 'doctor', 'hospital', 'pharmacy'],
-            'education': ['books', 'course', 'tuition', 'college'],
-        }
-        
-        for category, keywords in category_keywords.items():
-            if any(keyword in text_lower for keyword in keywords):
-                return category
+        match = _CATEGORY_KEYWORD_RE.search(text)
+        if match:
+            return _KEYWORD_TO_CATEGORY[match.group(1).lower()]
         
         # If no category found, return a default
         return 'miscellaneous'
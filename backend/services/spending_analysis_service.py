@@ -1,13 +1,55 @@
+import asyncio
 import logging
-import json
-from typing import Dict, Any, List, Optional
+import orjson
+from typing import Dict, Any, List, Optional, Tuple, Union
+from collections import defaultdict
+from operator import itemgetter
 from pydantic import BaseModel
 
-from .ai_service import AIService
-from .database_service import DatabaseService
+from .ai_service import get_ai_service
+from .cache_service import TTLCache, make_cache_key
+from .database_service import get_database_service
 
 logger = logging.getLogger(__name__)
 
+# Spending data changes as transactions are added, so keep analysis answers short-lived
+ANALYSIS_CACHE_PREFIX = "analyze-spending"
+ANALYSIS_CACHE_TTL_SECONDS = 300
+ANALYSIS_RESULT_CACHE_SIZE = 512
+
+class LazyCategoryMap:
+    """Category id -> name lookup, built only on the first id that needs resolving
+
+    Rows from the database already carry categoryName, so the map is usually never built.
+    """
+
+    def __init__(self, categories: List[Dict[str, str]]):
+        self._categories = categories
+        self._map: Optional[Dict[str, str]] = None
+
+    def get(self, category_id: Optional[str], default: str = 'Unknown') -> str:
+        if self._map is None:
+            self._map = {cat['id']: cat['name'] for cat in self._categories}
+        return self._map.get(category_id, default)
+
+def summarize_transactions(
+    transactions: List[Dict[str, Any]],
+    category_map: Union[Dict[str, str], LazyCategoryMap]
+) -> Tuple[float, Dict[str, float], Dict[str, Any]]:
+    """Return (total, per-category totals, largest transaction) in one pass"""
+    total = 0.0
+    category_totals: Dict[str, float] = defaultdict(float)
+    largest = transactions[0]
+    largest_amount = float('-inf')
+    for transaction in transactions:
+        amount = transaction.get('amount', 0)
+        total += amount
+        name = transaction.get('categoryName') or category_map.get(transaction.get('categoryId'), 'Unknown')
+        category_totals[name] += amount
+        if amount > largest_amount:
+            largest, largest_amount = transaction, amount
+    return total, dict(category_totals), largest
+
 class SpendingAnalysisResult(BaseModel):
     answer: str
     explanation: str
@@ -16,8 +58,11 @@ class SpendingAnalysisResult(BaseModel):
 
 class SpendingAnalysisService:
     def __init__(self):
-        self.ai_service = AIService()
-        self.db_service = DatabaseService()
+        self.ai_service = get_ai_service()
+        self.db_service = get_database_service()
+        # Parsed answers keyed by question plus the exact data sent, so edits to
+        # transactions change the key and never serve a stale answer
+        self.result_cache = TTLCache(maxsize=ANALYSIS_RESULT_CACHE_SIZE, ttl=ANALYSIS_CACHE_TTL_SECONDS)
     
     async def answer_spending_question(
         self,
@@ -39,14 +84,27 @@ class SpendingAnalysisService:
             SpendingAnalysisResult with answer and explanation
         """
         try:
-            logger.info(f"Analyzing spending for question: {question}")
+            logger.debug("Analyzing spending for question: %s", question)
+            
+            # Debug logging; the payload dumps are only built when DEBUG is on
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Data received - Year-Month: %s, %d transactions, %d categories",
+                    year_month, len(transactions), len(categories)
+                )
+                logger.debug("Transactions: %s", orjson.dumps(transactions, option=orjson.OPT_INDENT_2).decode())
+                logger.debug("Categories: %s", orjson.dumps(categories, option=orjson.OPT_INDENT_2).decode())
             
-            # Debug logging
-            logger.info(f"Data received - Year-Month: {year_month}")
-            logger.info(f"Transaction count: {len(transactions)}")
-            logger.info(f"Category count: {len(categories)}")
-            logger.info(f"Transactions: {json.dumps(transactions, indent=2)}")
-            logger.info(f"Categories: {json.dumps(categories, indent=2)}")
+            cache_key = make_cache_key(
+                question.strip(),
+                year_month,
+                orjson.dumps(transactions, default=str, option=orjson.OPT_SORT_KEYS).decode(),
+                orjson.dumps(categories, default=str, option=orjson.OPT_SORT_KEYS).decode()
+            )
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Spending analysis cache hit")
+                return cached
             
             # Create the prompt for spending analysis
             prompt = self._create_spending_analysis_prompt(
@@ -55,13 +113,23 @@ class SpendingAnalysisService:
             
             # Generate response using Gemini (preferred) or OpenAI
             try:
-                response = await self.ai_service.generate_with_gemini(prompt)
+                response = await self.ai_service.generate(
+                    prompt,
+                    cache_key_prefix=ANALYSIS_CACHE_PREFIX,
+                    ttl_seconds=ANALYSIS_CACHE_TTL_SECONDS,
+                    validate=self.ai_service.is_json_response
+                )
             except Exception as e:
-                logger.warning(f"Gemini failed, trying OpenAI: {str(e)}")
-                response = await self.ai_service.generate_with_openai(prompt)
+                # No provider answered: compute what we can locally (not cached,
+                # so the next request tries the model again)
+                logger.warning(f"AI analysis unavailable, using manual analysis: {str(e)}")
+                return self._analyze_transactions_manually(question, transactions, categories)
             
             # Parse the response
             result = self._parse_spending_analysis_response(response)
+            # A non-JSON reply falls back to a raw answer; don't pin that for the TTL
+            if self.ai_service.is_json_response(response):
+                self.result_cache.set(cache_key, result)
             logger.info(f"Spending analysis completed successfully")
             return result
             
@@ -92,9 +160,11 @@ class SpendingAnalysisService:
                 from datetime import datetime
                 year_month = datetime.now().strftime("%Y-%m")
             
-            # Get data from database
-            transactions = await self.db_service.get_transactions_by_month(year_month)
-            categories = await self.db_service.get_all_categories()
+            # Get data from database; the queries run on separate pooled readers
+            transactions, categories = await asyncio.gather(
+                self.db_service.get_transactions_by_month(year_month),
+                self.db_service.get_all_categories()
+            )
             
             logger.info(f"Retrieved {len(transactions)} transactions and {len(categories)} categories for {year_month}")
             
@@ -123,7 +193,7 @@ CRITICAL: Always use the rupee symbol (₹) when showing amounts.Always format c
 Instructions:
 1. ONLY analyze the transactions provided above
 2. If no transactions exist for the month, clearly state "No transactions found for this month"
-3. For category analysis, use the categoryName field from transactions (if available) or map categoryId to the categories list
+3. For category analysis, use the category field of each transaction
 4. Do NOT reference any categories that don't exist in the provided data
 5. Provide exact amounts and counts from the actual transaction data
 6. Respond in JSON format with the following structure:
@@ -135,18 +205,35 @@ Instructions:
 
 Remember: Base your answer ONLY on the provided transaction data. If the data shows different information than expected, report what the data actually shows."""
 
-        # Format the data for the prompt
+        # Format the data for the prompt as compact JSON (orjson) with resolved category names
+        category_map = LazyCategoryMap(categories)
+        category_names = [cat['name'] for cat in categories]
+        # Every row goes in: any single transaction may be what the question asks about
+        compact = [self._compact_transaction(t, category_map) for t in transactions]
+        
         data_section = f"""
 Data provided:
 - Year-Month (YYYY-MM): {year_month or 'Not specified'}
-- Available Categories: {json.dumps(categories, indent=2)}
-- Transactions for this month: {json.dumps(transactions, indent=2)}
+- Available Categories: {orjson.dumps(category_names).decode()}
+- Transactions for this month: {orjson.dumps(compact).decode()}
 
 Question: {question}
 """
 
         return f"{system_prompt}\n\n{data_section}"
     
+    def _compact_transaction(self, transaction: Dict[str, Any], category_map: LazyCategoryMap) -> Dict[str, Any]:
+        """Keep only the fields the model needs, dropping ids and empty notes"""
+        compact = {
+            'amount': transaction.get('amount', 0),
+            'category': transaction.get('categoryName')
+                or category_map.get(transaction.get('categoryId'), 'Unknown'),
+            'date': str(transaction.get('date', ''))[:10]
+        }
+        if transaction.get('notes'):
+            compact['notes'] = transaction['notes']
+        return compact
+    
     def _parse_spending_analysis_response(self, response: str) -> SpendingAnalysisResult:
         """
         Parse the AI response into SpendingAnalysisResult
@@ -168,11 +255,17 @@ Question: {question}
             if 'explanation' not in parsed_data:
                 raise Exception("Explanation field not found in response")
             
-            return SpendingAnalysisResult(
-                answer=str(parsed_data['answer']),
-                explanation=str(parsed_data['explanation']),
-                sql=parsed_data.get('sql'),
-                preview=parsed_data.get('preview')
+            answer = parsed_data['answer']
+            explanation = parsed_data['explanation']
+            sql = parsed_data.get('sql')
+            preview = parsed_data.get('preview')
+
+            # Every field is coerced to str/None here, so skip pydantic re-validation
+            return SpendingAnalysisResult.model_construct(
+                answer=answer if isinstance(answer, str) else str(answer),
+                explanation=explanation if isinstance(explanation, str) else str(explanation),
+                sql=sql if sql is None or isinstance(sql, str) else str(sql),
+                preview=preview if preview is None or isinstance(preview, str) else str(preview)
             )
             
         except Exception as e:
@@ -202,29 +295,17 @@ Question: {question}
                 preview="No data available"
             )
         
-        # Create category mapping
-        category_map = {cat['id']: cat['name'] for cat in categories}
+        # Category mapping, built only if some transaction lacks categoryName
+        category_map = LazyCategoryMap(categories)
         
-        # Calculate basic statistics
-        total_amount = sum(t.get('amount', 0) for t in transactions)
+        # Total, per-category totals and largest transaction in one pass
         transaction_count = len(transactions)
+        total_amount, category_totals, largest_transaction = summarize_transactions(
+            transactions, category_map
+        )
         
-        # Group by category
-        category_totals = {}
-        for transaction in transactions:
-            category_id = transaction.get('categoryId')
-            category_name = transaction.get('categoryName') or category_map.get(category_id, 'Unknown')
-            amount = transaction.get('amount', 0)
-            
-            if category_name not in category_totals:
-                category_totals[category_name] = 0
-            category_totals[category_name] += amount
-        
-        # Find top category
-        top_category = max(category_totals.items(), key=lambda x: x[1]) if category_totals else None
-        
-        # Find largest transaction
-        largest_transaction = max(transactions, key=lambda x: x.get('amount', 0)) if transactions else None
+        # Find top category (max keeps the first maximum)
+        top_category = max(category_totals.items(), key=itemgetter(1))
         
         # Generate answer based on question type
         question_lower = question.lower()
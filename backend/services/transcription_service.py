@@ -1,12 +1,12 @@
+import io
 import base64
+import asyncio
 import logging
-import tempfile
 import os
 from typing import Dict, Any
-import httpx
 from pydantic import BaseModel
 
-from .ai_service import AIService
+from .ai_service import get_ai_service, get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +15,7 @@ class TranscriptionResult(BaseModel):
 
 class TranscriptionService:
     def __init__(self):
-        self.ai_service = AIService()
+        self.ai_service = get_ai_service()
     
     async def transcribe_audio(self, audio_data_uri: str) -> TranscriptionResult:
         """
@@ -37,35 +37,27 @@ class TranscriptionService:
             # Split the data URI to get the base64 part
             header, base64_data = audio_data_uri.split(',', 1)
             
-            # Decode base64 data
-            audio_data = base64.b64decode(base64_data)
+            # Upload from memory; the SDK takes the file name from .name.
+            # Decoding a multi-MB clip is CPU-bound, so keep it off the event loop
+            audio_file = io.BytesIO(await asyncio.to_thread(base64.b64decode, base64_data))
+            audio_file.name = 'audio.webm'
+            del base64_data
             
-            # Create temporary file for the audio
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_file:
-                temp_file.write(audio_data)
-                temp_file_path = temp_file.name
-            
-            try:
-                # Use OpenAI Whisper API
-                result = await self._transcribe_with_openai(temp_file_path)
-                logger.info(f"Transcription completed: {result.text[:50]}...")
-                return result
-                
-            finally:
-                # Clean up temporary file
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            # Use OpenAI Whisper API
+            result = await self._transcribe_with_openai(audio_file)
+            logger.info(f"Transcription completed: {result.text[:50]}...")
+            return result
                     
         except Exception as e:
             logger.error(f"Transcription error: {str(e)}")
             raise Exception(f"Transcription failed: {str(e)}")
     
-    async def _transcribe_with_openai(self, audio_file_path: str) -> TranscriptionResult:
+    async def _transcribe_with_openai(self, audio_file: io.BytesIO) -> TranscriptionResult:
         """
         Transcribe audio using OpenAI Whisper API
         
         Args:
-            audio_file_path: Path to the audio file
+            audio_file: In-memory audio with a .name carrying the file extension
             
         Returns:
             TranscriptionResult with transcribed text
@@ -74,20 +66,19 @@ class TranscriptionService:
             raise Exception("OpenAI client not initialized")
         
         try:
-            with open(audio_file_path, 'rb') as audio_file:
-                response = self.ai_service.openai_client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    response_format="json"
-                )
-                
-                return TranscriptionResult(text=response.text)
+            response = await self.ai_service.openai_client.audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                response_format="json"
+            )
+            
+            return TranscriptionResult(text=response.text)
                 
         except Exception as e:
             logger.error(f"OpenAI transcription error: {str(e)}")
             raise Exception(f"OpenAI transcription failed: {str(e)}")
     
-    async def _transcribe_with_http(self, audio_file_path: str) -> TranscriptionResult:
+    async def _transcribe_with_http(self, audio_file: io.BytesIO) -> TranscriptionResult:
         """
         Alternative method using direct HTTP requests to OpenAI API
         """
@@ -96,25 +87,25 @@ class TranscriptionService:
             raise Exception("OPENAI_API_KEY not found")
         
         try:
-            with open(audio_file_path, 'rb') as audio_file:
-                files = {'file': ('audio.webm', audio_file, 'audio/webm')}
-                data = {'model': 'whisper-1'}
-                headers = {'Authorization': f'Bearer {openai_api_key}'}
-                
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        'https://api.openai.com/v1/audio/transcriptions',
-                        files=files,
-                        data=data,
-                        headers=headers
-                    )
-                    
-                    if response.status_code != 200:
-                        error_data = response.json()
-                        raise Exception(f"OpenAI API error: {response.status_code} - {error_data}")
-                    
-                    result = response.json()
-                    return TranscriptionResult(text=result['text'])
+            files = {'file': ('audio.webm', audio_file, 'audio/webm')}
+            data = {'model': 'whisper-1'}
+            headers = {'Authorization': f'Bearer {openai_api_key}'}
+            
+            # Shared pooled client keeps the connection to api.openai.com warm between uploads
+            response = await get_http_client().post(
+                'https://api.openai.com/v1/audio/transcriptions',
+                files=files,
+                data=data,
+                headers=headers,
+                timeout=60
+            )
+            
+            if response.status_code != 200:
+                error_data = response.json()
+                raise Exception(f"OpenAI API error: {response.status_code} - {error_data}")
+            
+            result = response.json()
+            return TranscriptionResult(text=result['text'])
                     
         except Exception as e:
             logger.error(f"HTTP transcription error: {str(e)}")
@@ -74,6 +74,12 @@ async def test_database():
         for txn in transactions:
             print(f"   - ₹{txn['amount']} for {txn['categoryName']} ({txn['notes']})")
         
+        # Test 4b: Get transactions by IDs
+        print("\n🔎 Test 4b: Fetching transactions by IDs...")
+        by_ids = await db.get_transactions_by_ids([transaction2['id'], transaction1['id'], 'missing-id'])
+        assert [txn['id'] for txn in by_ids] == [transaction2['id'], transaction1['id']]
+        print(f"✅ Retrieved {len(by_ids)} transactions by ID")
+        
         # Test 5: Get monthly summary
         print("\n📊 Test 5: Getting monthly summary...")
         summary = await db.get_monthly_summary(current_month)
@@ -115,6 +121,8 @@ async def test_database():
         raise
     
     finally:
+        await db.close()
+        
         # Clean up test database
         import os
         if os.path.exists("test_expenseai.db"):
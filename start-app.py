@@ -4,61 +4,357 @@ Startup script for ExpenseAI Application
 Runs both Python backend and Next.js frontend
 """
 
-import subprocess
+import asyncio
 import sys
 import os
 import time
+import shutil
 import signal
-import threading
+import socket
+import subprocess
 from pathlib import Path
+from urllib.parse import urlsplit
+
+BACKEND_PORT = 8000
+FRONTEND_PORT = 9002
+# Printed by the backend once its startup hooks finish (see backend/main.py)
+BACKEND_READY_MARKER = b"ExpenseAI backend ready"
+PUMP_CHUNK_SIZE = 64 * 1024  # child output forwarded per write
+SHUTDOWN_GRACE_SECONDS = 3
+# Crashed services are restarted after 1s, doubling up to 30s while they keep failing
+RESTART_MIN_DELAY = 1
+RESTART_MAX_DELAY = 30
+RESTART_STABLE_SECONDS = 60  # uptime after which the restart delay resets
+RESTART_MAX_ATTEMPTS = 5  # consecutive quick crashes before the launcher gives up
+
+# Each service gets its own process group so shutdown reaches its workers too.
+# Use start_new_session rather than preexec_fn=os.setsid: on Linux CPython spawns
+# via vfork unless preexec_fn is set, so the parent's memory is never copied.
+if os.name == "nt":
+    _NEW_PROCESS_GROUP = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    _NEW_PROCESS_GROUP = {"start_new_session": True}
+
+def _write_stdout(data):
+    """Write bytes straight to fd 1 (print() is line-buffered, so nothing is pending)"""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(1, view):]
 
-def run_command(command, cwd=None, name="Process"):
-    """Run a command and handle its output"""
+async def _pump(stream, name, ready_event=None):
+    """Forward a child's output in chunks, prefixing every line with the service name
+
+    Only whole lines are written, so output from two services never interleaves
+    mid-line; a trailing partial line waits for its newline (or for EOF).
+    ready_event, if given, is set when the backend's readiness marker goes by.
+    """
+    # Prefixes are built once and hot-loop callables bound to locals
+    prefix = f"[{name}] ".encode()
+    newline_prefix = b"\n" + prefix
+    read, write = stream.read, _write_stdout
+    pending = b""
+    while True:
+        chunk = await read(PUMP_CHUNK_SIZE)
+        if not chunk:
+            break
+        data = pending + chunk
+        cut = data.rfind(b"\n") + 1
+        if not cut and len(data) < PUMP_CHUNK_SIZE:
+            pending = data
+            continue
+        if not cut:
+            # An over-long line is forwarded in pieces, each ended with a newline so
+            # the other service's next line never starts mid-line
+            lines, pending = data + b"\n", b""
+        else:
+            lines, pending = data[:cut], data[cut:]
+        if ready_event is not None and BACKEND_READY_MARKER in lines:
+            ready_event.set()
+        write(prefix + lines[:-1].replace(b"\n", newline_prefix) + lines[-1:])
+    if pending:
+        write(prefix + pending.replace(b"\n", newline_prefix) + b"\n")
+
+async def run_command(command, cwd=None, name="Process"):
+    """Start an argv list (no shell) and forward its output from a task on the running loop
+
+    The returned process carries pump_task and a `ready` event that is set when
+    the child prints BACKEND_READY_MARKER.
+    """
     print(f"Starting {name}...")
-    print(f"Command: {command}")
+    print(f"Command: {' '.join(command)}")
     print(f"Working directory: {cwd or os.getcwd()}")
     print("-" * 50)
     
     try:
-        process = subprocess.Popen(
-            command,
-            shell=True,
+        process = await asyncio.create_subprocess_exec(
+            *command,
             cwd=cwd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            bufsize=1
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            **_NEW_PROCESS_GROUP
         )
         
-        # Print output in real-time
-        for line in process.stdout:
-            print(f"[{name}] {line.rstrip()}")
+        # Print output in real-time without blocking the caller
+        process.ready = asyncio.Event()
+        process.pump_task = asyncio.create_task(_pump(process.stdout, name, process.ready))
         
         return process
     except Exception as e:
         print(f"Error starting {name}: {e}")
         return None
 
-def check_backend_health(url="http://localhost:8000/health", max_retries=30):
-    """Check if the backend is healthy"""
+def _port_open(host, port, timeout=0.2):
+    """Return True if something is accepting TCP connections on host:port"""
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+async def wait_for_port(host, port, max_wait=60):
+    """Wait until host:port accepts TCP connections, backing off up to 1s"""
+    delay = 0.1
+    deadline = time.monotonic() + max_wait
+    while time.monotonic() < deadline:
+        if await asyncio.to_thread(_port_open, host, port):
+            return True
+        await asyncio.sleep(delay)
+        delay = min(delay * 1.7, 1.0)
+    return False
+
+_health_session = None
+
+def is_healthy(url):
+    """Return True if url answers 2xx; a cheap TCP connect gates the HTTP request"""
+    global _health_session
+    parsed = urlsplit(url)
+    if not _port_open(parsed.hostname, parsed.port or 80):
+        return False
+    
+    # requests is only worth importing once the listener is up
     import requests
+    from requests.adapters import HTTPAdapter
     
-    for i in range(max_retries):
-        try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                print("✅ Backend is healthy!")
-                return True
-        except:
-            pass
+    if _health_session is None:
+        # One pooled keep-alive connection for every probe
+        _health_session = requests.Session()
+        _health_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+    try:
+        return _health_session.get(url, timeout=1).ok
+    except requests.RequestException:
+        return False
+
+async def check_backend_health(url=f"http://localhost:{BACKEND_PORT}/health", max_wait=60, ready_event=None):
+    """Check if the backend is healthy, backing off from 100ms to 1s between attempts
+
+    With ready_event (set by the output pump on the backend's readiness marker)
+    the next probe runs as soon as the marker arrives instead of on the next
+    backoff tick; polling stays as the fallback if the marker never shows up.
+    """
+    delay = 0.1
+    attempt = 0
+    deadline = time.monotonic() + max_wait
+    while time.monotonic() < deadline:
+        attempt += 1
+        # is_healthy does blocking socket/HTTP I/O, so keep it off the loop
+        if await asyncio.to_thread(is_healthy, url):
+            print("✅ Backend is healthy!")
+            return True
         
-        print(f"⏳ Waiting for backend to start... ({i+1}/{max_retries})")
-        time.sleep(2)
+        print(f"⏳ Waiting for backend to start... (attempt {attempt})")
+        if ready_event is not None and not ready_event.is_set():
+            try:
+                await asyncio.wait_for(ready_event.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            await asyncio.sleep(delay)
+        delay = min(delay * 1.7, 1.0)
     
     print("❌ Backend failed to start")
     return False
 
-def main():
+def _signal_group(process, signum):
+    """Signal a service's whole process group (just the process on Windows)"""
+    try:
+        if os.name != "nt":
+            # The group outlives its leader, so orphaned workers are reached even after it exits
+            os.killpg(process.pid, signum)
+        elif process.returncode is None:
+            process.kill() if signum == getattr(signal, "SIGKILL", None) else process.terminate()
+    except ProcessLookupError:
+        pass
+
+async def stop_services(*processes):
+    """Terminate each service's process tree, escalating to SIGKILL after a grace period"""
+    processes = [process for process in processes if process]
+    for process in processes:
+        _signal_group(process, signal.SIGTERM)
+    for process in processes:
+        try:
+            await asyncio.wait_for(process.wait(), SHUTDOWN_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            _signal_group(process, getattr(signal, "SIGKILL", signal.SIGTERM))
+            await process.wait()
+    pumps = [process.pump_task for process in processes]
+    if pumps:
+        await asyncio.wait(pumps, timeout=1)
+
+async def supervise(services, processes):
+    """Restart any service that crashes, backing off while it keeps crashing
+
+    services maps name -> (command, cwd, port, ready), where ready(process) is a
+    coroutine that waits for the service to come up; processes maps name -> the
+    running process and is updated in place, so the caller always stops the live
+    ones. A service that exits with code 0 is left stopped. Returns 1 once a
+    service cannot be restarted, never becomes ready or keeps crashing, so the
+    caller stops the rest instead of running with a dead service.
+    """
+    started_at = {name: time.monotonic() for name in processes}
+    delays = {name: RESTART_MIN_DELAY for name in processes}
+    failures = {name: 0 for name in processes}
+    waiters = {asyncio.ensure_future(process.wait()): name for name, process in processes.items()}
+    try:
+        while waiters:
+            done, _ = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in done:
+                name = waiters.pop(waiter)
+                process = processes.pop(name)
+                # Reap workers the service left behind, then let its output drain
+                _signal_group(process, signal.SIGTERM)
+                await asyncio.wait([process.pump_task], timeout=1)
+                
+                if process.returncode == 0:
+                    print(f"ℹ️  {name} exited cleanly; not restarting it")
+                    continue
+                
+                # A service that stayed up for a while starts over at the shortest delay
+                if time.monotonic() - started_at[name] > RESTART_STABLE_SECONDS:
+                    delays[name] = RESTART_MIN_DELAY
+                    failures[name] = 0
+                failures[name] += 1
+                if failures[name] > RESTART_MAX_ATTEMPTS:
+                    print(f"❌ {name} exited with code {process.returncode} "
+                          f"after {RESTART_MAX_ATTEMPTS} restarts; giving up")
+                    return 1
+                delay = delays[name]
+                delays[name] = min(delay * 2, RESTART_MAX_DELAY)
+                print(f"⚠️  {name} exited with code {process.returncode}; restarting in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                
+                command, cwd, port, ready = services[name]
+                # A worker that outlived the crash would take the new process's port
+                if not await asyncio.to_thread(_free_port, port, cwd):
+                    return 1
+                process = await run_command(command, cwd=cwd, name=name)
+                if not process:
+                    print(f"❌ Failed to restart {name}")
+                    return 1
+                processes[name] = process
+                started_at[name] = time.monotonic()
+                waiters[asyncio.ensure_future(process.wait())] = name
+                
+                if not await ready(process):
+                    print(f"❌ {name} did not become ready after restarting")
+                    return 1
+                print(f"✅ {name} restarted")
+        return 0
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+
+def _listening_pids(port):
+    """PIDs with a TCP listener on port, via psutil when installed, else lsof"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    
+    if psutil is not None:
+        try:
+            return {
+                conn.pid for conn in psutil.net_connections("tcp")
+                if conn.laddr and conn.laddr.port == port
+                and conn.status == psutil.CONN_LISTEN and conn.pid
+            }
+        except psutil.AccessDenied:
+            pass
+    
+    lsof = shutil.which("lsof")
+    if not lsof:
+        return set()
+    result = subprocess.run(
+        [lsof, "-t", f"-iTCP:{port}", "-sTCP:LISTEN"],
+        capture_output=True, text=True
+    )
+    return {int(pid) for pid in result.stdout.split()}
+
+def _process_cwd(pid):
+    """Working directory of pid, or None if it cannot be determined"""
+    try:
+        import psutil
+        return Path(psutil.Process(pid).cwd()).resolve()
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    
+    try:
+        return Path(os.readlink(f"/proc/{pid}/cwd")).resolve()
+    except OSError:
+        pass
+    
+    # macOS and other systems without /proc
+    lsof = shutil.which("lsof")
+    if lsof:
+        result = subprocess.run(
+            [lsof, "-a", "-p", str(pid), "-d", "cwd", "-Fn"],
+            capture_output=True, text=True
+        )
+        for line in result.stdout.splitlines():
+            if line.startswith("n"):
+                return Path(line[1:]).resolve()
+    return None
+
+def _free_port(port, owner_dir):
+    """Stop a stale listener on port left over from a previous run of this app
+
+    Only processes running from owner_dir (the service's working directory) are
+    stopped. Returns False, leaving it alone, if something else holds the port.
+    """
+    if os.name == "nt":
+        return True
+    pids = _listening_pids(port) - {os.getpid()}
+    if not pids:
+        return True
+    
+    owner_dir = Path(owner_dir).resolve()
+    foreign = sorted(pid for pid in pids if _process_cwd(pid) != owner_dir)
+    if foreign:
+        print(f"❌ Port {port} is in use by PID(s) {', '.join(map(str, foreign))}, "
+              f"which are not part of this app; stop them or free the port and retry")
+        return False
+    
+    print(f"⚠️  Port {port} is held by a previous run (PID(s) {', '.join(map(str, sorted(pids)))}); stopping it")
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError) as e:
+            print(f"Could not stop PID {pid}: {e}")
+    deadline = time.monotonic() + SHUTDOWN_GRACE_SECONDS
+    while _port_open("localhost", port) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    return True
+
+def _list_dir(path):
+    """Names of the entries in path, or an empty set if it cannot be read"""
+    try:
+        with os.scandir(path) as entries:
+            return {entry.name for entry in entries}
+    except OSError:
+        return set()
+
+async def main():
     # Get the project root directory
     project_root = Path(__file__).parent
     backend_dir = project_root / "backend"
@@ -70,75 +366,91 @@ def main():
     print(f"Frontend directory: {frontend_dir}")
     print("=" * 60)
     
+    # One directory listing per level answers both preflight checks
+    has_backend = "backend" in _list_dir(project_root)
+    backend_entries = _list_dir(backend_dir) if has_backend else set()
+    
     # Check if backend directory exists
-    if not backend_dir.exists():
+    if not has_backend:
         print("❌ Backend directory not found!")
         print("Please ensure the backend/ directory exists with the Python backend files.")
-        sys.exit(1)
+        return 1
     
     # Check if .env file exists in backend
-    backend_env = backend_dir / ".env"
-    if not backend_env.exists():
+    if ".env" not in backend_entries:
         print("⚠️  Backend .env file not found!")
         print("Please copy backend/env.example to backend/.env and configure your API keys.")
         print("You can still start the app, but AI features may not work.")
     
-    # Start backend
-    backend_process = run_command(
-        "python run.py",
-        cwd=backend_dir,
-        name="Python Backend"
-    )
-    
-    if not backend_process:
-        print("❌ Failed to start backend")
-        sys.exit(1)
-    
-    # Wait for backend to be healthy
-    print("\n🔍 Checking backend health...")
-    if not check_backend_health():
-        print("❌ Backend health check failed")
-        backend_process.terminate()
-        sys.exit(1)
-    
-    # Start frontend
-    print("\n🌐 Starting frontend...")
-    frontend_process = run_command(
-        "npm run dev",
-        cwd=frontend_dir,
-        name="Next.js Frontend"
-    )
+    # A backend left running by an earlier session would answer our health checks
+    if not _free_port(BACKEND_PORT, backend_dir):
+        return 1
     
-    if not frontend_process:
-        print("❌ Failed to start frontend")
-        backend_process.terminate()
-        sys.exit(1)
-    
-    print("\n🎉 Application started successfully!")
-    print("📱 Frontend: http://localhost:9002")
-    print("🔧 Backend: http://localhost:8000")
-    print("📚 Backend API Docs: http://localhost:8000/docs")
-    print("\nPress Ctrl+C to stop all services")
+    # Ctrl+C / SIGTERM cancel main() so the finally below always stops the services
+    # (POSIX only; on Windows asyncio.run turns Ctrl+C into the same cancellation)
+    loop = asyncio.get_running_loop()
+    main_task = asyncio.current_task()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, main_task.cancel)
+        except NotImplementedError:
+            pass
     
-    # Handle graceful shutdown
-    def signal_handler(signum, frame):
+    services = {
+        "Python Backend": (
+            [sys.executable, "run.py"], backend_dir, BACKEND_PORT,
+            lambda process: check_backend_health(ready_event=process.ready)
+        ),
+        "Next.js Frontend": (
+            # npm is a .cmd shim on Windows, so resolve its real path instead of using a shell
+            [shutil.which("npm") or "npm", "run", "dev"], frontend_dir, FRONTEND_PORT,
+            lambda process: wait_for_port("localhost", FRONTEND_PORT)
+        ),
+    }
+    processes = {}
+    exit_code = 0
+    try:
+        # Start both services at once; the frontend's dev build does not need the backend
+        for name, (command, cwd, _port, _ready) in services.items():
+            process = await run_command(command, cwd=cwd, name=name)
+            if not process:
+                print(f"❌ Failed to start {name}")
+                return 1
+            processes[name] = process
+        
+        # Wait for both to come up concurrently
+        print("\n🔍 Checking backend health...")
+        backend_ready, frontend_ready = await asyncio.gather(
+            *(ready(processes[name]) for name, (_, _, _, ready) in services.items())
+        )
+        if not backend_ready:
+            print("❌ Backend health check failed")
+            exit_code = 1
+            return exit_code
+        if frontend_ready:
+            print("✅ Frontend is ready")
+        else:
+            print("⚠️  Frontend is not accepting connections yet; it may still be compiling")
+        
+        print("\n🎉 Application started successfully!")
+        print(f"📱 Frontend: http://localhost:{FRONTEND_PORT}")
+        print(f"🔧 Backend: http://localhost:{BACKEND_PORT}")
+        print(f"📚 Backend API Docs: http://localhost:{BACKEND_PORT}/docs")
+        print("\nPress Ctrl+C to stop all services")
+        
+        exit_code = await supervise(services, processes)
+    except asyncio.CancelledError:
+        pass
+    finally:
         print("\n🛑 Shutting down services...")
-        if backend_process:
-            backend_process.terminate()
-        if frontend_process:
-            frontend_process.terminate()
+        await stop_services(*processes.values())
         print("✅ Services stopped")
-        sys.exit(0)
-    
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-    
-    # Wait for processes to complete
-    try:
-        backend_process.wait()
-        frontend_process.wait()
-    except KeyboardInterrupt:
-        signal_handler(signal.SIGINT, None)
+    return exit_code
 
 if __name__ == "__main__":
-    main()
+    # Pumps write to fd 1 directly; line-buffered print() keeps the two in order without per-chunk flushes
+    sys.stdout.reconfigure(line_buffering=True)
+    try:
+        sys.exit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        sys.exit(0)